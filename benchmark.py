@@ -0,0 +1,402 @@
+#!/usr/bin/env python3
+
+import argparse
+import bz2
+import json
+import lzma
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tarfile
+import threading
+import time
+from contextlib import redirect_stdout
+from hashlib import sha512
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from os.path import basename, getsize
+from os.path import join as path_join
+from tempfile import mkdtemp
+from typing import Any, Callable, Dict, Optional
+
+import firefox_installer
+
+
+def make_tree(root: str, files: int, file_size: int) -> None:
+    # Half random and half repetitive data, so it compresses roughly like the
+    # binaries of a Firefox build do.
+    for i in range(files):
+        directory = path_join(root, "firefox", f"dir{i % 16}")
+        os.makedirs(directory, exist_ok=True)
+        with open(path_join(directory, f"file{i}"), "wb") as fp:
+            fp.write(os.urandom(file_size // 2))
+            fp.write(b"firefox" * (file_size // 2 // 7))
+    os.symlink("dir0/file0", path_join(root, "firefox", "firefox"))
+
+
+def make_archive(root: str, path: str, compression: str) -> str:
+    with tarfile.open(path, "w") as tar:
+        tar.add(path_join(root, "firefox"), "firefox")
+    # Prefer the external tools, xz -T0 writes the multi-block archives that
+    # can be decompressed in parallel.
+    command = {"xz": ["xz", "-T0", "-f"], "bz2": ["bzip2", "-f"]}[compression]
+    if shutil.which(command[0]):
+        subprocess.run(command + [path], check=True)
+        return f"{path}.{compression}"
+    module = {"xz": lzma, "bz2": bz2}[compression]
+    with open(path, "rb") as src, module.open(f"{path}.{compression}", "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(path)
+    return f"{path}.{compression}"
+
+
+def time_extract(extract: Callable[[str], Any], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        dest = mkdtemp()
+        try:
+            start = time.perf_counter()
+            extract(dest)
+            best = min(best, time.perf_counter() - start)
+        finally:
+            shutil.rmtree(dest)
+    return best
+
+
+def bench_extract(archive: str, workers: int, repeat: int) -> Dict[str, float]:
+    def baseline(dest: str) -> None:
+        with tarfile.open(archive) as tar:
+            tar.extractall(dest)
+
+    def engine(use_external: bool, n: int) -> Callable[[str], None]:
+        def run(dest: str) -> None:
+            with open(archive, "rb") as fp:
+                firefox_installer.extract_tar(
+                    *firefox_installer.open_tar_stream(fp, use_external), dest, n
+                )
+
+        return run
+
+    results = {
+        "tarfile_extractall": time_extract(baseline, repeat),
+        "engine_1_worker": time_extract(engine(False, 1), repeat),
+        f"engine_{workers}_workers": time_extract(engine(False, workers), repeat),
+        f"engine_{workers}_workers_external": time_extract(
+            engine(True, workers), repeat
+        ),
+    }
+    results["speedup"] = results["tarfile_extractall"] / min(results.values())
+    return results
+
+
+VERSION = "118.0"
+PRODUCTS = (
+    "desktop_release",
+    "desktop_beta",
+    "desktop_developer",
+    "desktop_nightly",
+    "desktop_esr",
+    "android_release",
+)
+PLATFORMS = ("win64", "win64-msi", "win", "osx", "linux64", "linux")
+
+
+def make_download_page(base_url: str, languages: int) -> bytes:
+    # Laid out like mozilla.org/firefox/all/: one select per product for the
+    # platforms and languages, then a list of download links per product.
+    names = ["en-US", "de", "fr"] + [f"l{i}" for i in range(max(0, languages - 3))]
+    out = ["<!DOCTYPE html><html><head><title>Firefox</title></head><body>"]
+    out.append('<select id="select-product">')
+    out.extend(f'<option value="{p}">{p}</option>' for p in PRODUCTS)
+    out.append("</select>")
+    for product in PRODUCTS:
+        for kind, values in (("platform", PLATFORMS), ("language", names)):
+            out.append(f'<select id="select_{product}_{kind}">')
+            out.extend(f'<option value="{v}">{v}</option>' for v in values)
+            out.append("</select>")
+    for product in PRODUCTS:
+        out.append(f'<ol class="c-all-downloads" data-product="{product}">')
+        for language in names:
+            out.append(f'<li data-language="{language}"><h3>{language}</h3><ul>')
+            for platform in PLATFORMS:
+                out.append(
+                    f'<li><a href="{base_url}/bouncer/{product}/{platform}/{language}"'
+                    f' data-link-type="download" data-download-version="{platform}"'
+                    f' data-display-name="Firefox">Download</a></li>'
+                )
+            out.append("</ul></li>")
+        out.append("</ol>")
+    out.append("</body></html>")
+    return "\n".join(out).encode("utf-8")
+
+
+class MozillaHandler(BaseHTTPRequestHandler):
+    """Serves the download page, bouncer redirects, archives and checksums."""
+
+    protocol_version = "HTTP/1.1"
+    page = b""
+    archive = ""
+    digest = ""
+    connections = 0
+
+    def setup(self) -> None:
+        type(self).connections += 1
+        super().setup()
+
+    def log_message(self, *args: Any) -> None:
+        pass
+
+    def do_HEAD(self) -> None:
+        self.respond(send_body=False)
+
+    def do_GET(self) -> None:
+        self.respond(send_body=True)
+
+    def respond(self, send_body: bool) -> None:
+        if self.path == "/firefox/all/":
+            self.send_bytes(self.page, "text/html", send_body)
+        elif self.path.startswith("/bouncer/"):
+            _, _, _, platform, language = self.path.split("/")
+            self.send_response(302)
+            self.send_header(
+                "Location",
+                f"/pub/firefox/releases/{VERSION}/{platform}/{language}/"
+                f"{self.archive_name()}",
+            )
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+        elif self.path.endswith("/SHA512SUMS"):
+            lines = [
+                f"{self.digest}  {platform}/{language}/{self.archive_name()}"
+                for platform in PLATFORMS
+                for language in ("en-US", "de", "fr")
+            ]
+            self.send_bytes("\n".join(lines).encode("utf-8"), "text/plain", send_body)
+        elif self.path.endswith(self.archive_name()):
+            self.send_archive(send_body)
+        else:
+            self.send_error(404)
+
+    def archive_name(self) -> str:
+        return f"firefox-{VERSION}.{basename(self.archive).split('.', 1)[1]}"
+
+    def send_bytes(self, data: bytes, content_type: str, send_body: bool) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        if send_body:
+            self.wfile.write(data)
+
+    def send_archive(self, send_body: bool) -> None:
+        size = getsize(self.archive)
+        start, end = 0, size - 1
+        match = re.fullmatch(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+        if match:
+            start = int(match.group(1))
+            end = min(int(match.group(2) or end), end)
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        else:
+            self.send_response(200)
+        self.send_header("Content-Type", "application/x-tar")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.send_header("Accept-Ranges", "bytes")
+        self.end_headers()
+        if not send_body:
+            return
+        with open(self.archive, "rb") as fp:
+            fp.seek(start)
+            left = end - start + 1
+            while left:
+                chunk = fp.read(min(left, 1024 * 1024))
+                if not chunk:
+                    break
+                self.wfile.write(chunk)
+                left -= len(chunk)
+
+
+def start_server(page_languages: int, page: Optional[str]) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MozillaHandler)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    if page is not None:
+        # A recorded copy of the real page; its links are pointed at the
+        # local bouncer so nothing leaves the machine.
+        with open(page, "rb") as fp:
+            MozillaHandler.page = re.sub(
+                rb'href="https://download\.mozilla\.org/\?product=[^"]*'
+                rb'&amp;os=([^"&]+)&amp;lang=([^"&]+)"',
+                lambda m: b'href="%s/bouncer/x/%s/%s"'
+                % (base_url.encode("ascii"), m.group(1), m.group(2)),
+                fp.read(),
+            )
+    else:
+        MozillaHandler.page = make_download_page(base_url, page_languages)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def time_phase(run: Callable[[], Any], repeat: int) -> Dict[str, float]:
+    wall, cpu = float("inf"), float("inf")
+    for _ in range(repeat):
+        start, start_cpu = time.perf_counter(), time.process_time()
+        run()
+        wall = min(wall, time.perf_counter() - start)
+        cpu = min(cpu, time.process_time() - start_cpu)
+    return {"wall": wall, "cpu": cpu}
+
+
+def bench_phases(
+    archive: str,
+    page_languages: int,
+    page: Optional[str],
+    connections: int,
+    repeat: int,
+) -> Dict[str, Any]:
+    """Time each phase of an install against a local stand-in for Mozilla."""
+    fi = firefox_installer
+    MozillaHandler.archive = archive
+    with open(archive, "rb") as fp:
+        MozillaHandler.digest = sha512(fp.read()).hexdigest()
+    MozillaHandler.connections = 0
+    server = start_server(page_languages, page)
+    page_url = f"http://127.0.0.1:{server.server_address[1]}/firefox/all/"
+    work_dir = mkdtemp()
+    saved_environ = dict(os.environ)
+    saved_prompt = fi.prompt
+    fi.METRICS.show_progress = False
+    os.environ["XDG_CACHE_HOME"] = path_join(work_dir, "cache")
+    os.environ["XDG_DATA_HOME"] = path_join(work_dir, "data")
+    # The selections are answered with the first matching option.
+    fi.prompt = lambda text, options: next(
+        (x for x in options if x in ("desktop_release", "linux64", "en-US")),
+        options[0],
+    )
+    results = {}
+    try:
+        with redirect_stdout(sys.stderr):
+
+            def fetch_page() -> Dict[str, Any]:
+                shutil.rmtree(fi.get_cache_dir(), ignore_errors=True)
+                return fi.parsed_download_page(page_url, 0)
+
+            results["parsed_download_page"] = time_phase(fetch_page, repeat)
+            results["parsed_download_page_cached"] = time_phase(
+                lambda: fi.parsed_download_page(page_url), repeat
+            )
+            index = fetch_page()
+            selection = {}
+
+            def select() -> None:
+                selection["product"] = fi.get_product_selection(index)
+                selection["platform"] = fi.get_platform_selection(
+                    index, selection["product"]
+                )
+                selection["language"] = fi.get_language_selection(
+                    index, selection["product"]
+                )
+                selection["href"] = fi.get_current_href(
+                    index,
+                    selection["product"],
+                    selection["language"],
+                    selection["platform"],
+                )
+
+            results["lookups"] = time_phase(select, repeat)
+            spec = (selection["product"], selection["platform"], selection["language"])
+            extract_dir = fi.get_extract_dir(*spec)
+
+            def download() -> None:
+                shutil.rmtree(path_join(work_dir, "downloads"), ignore_errors=True)
+                fi.ranged_download(
+                    selection["href"], path_join(work_dir, "downloads"), connections
+                )
+
+            results["download"] = time_phase(download, repeat)
+            results["download"]["mib_per_second"] = (
+                getsize(archive) / 1024 / 1024 / results["download"]["wall"]
+            )
+
+            def extract() -> None:
+                shutil.rmtree(extract_dir, ignore_errors=True)
+                fi.extract_archive(archive, extract_dir, strip_components=1)
+
+            results["extract"] = time_phase(extract, repeat)
+            results["create_desktop"] = time_phase(
+                lambda: fi.create_desktop(*spec, extract_dir), repeat
+            )
+
+            def install() -> None:
+                shutil.rmtree(fi.get_cache_dir(), ignore_errors=True)
+                fi.download_and_extract(
+                    selection["href"], extract_dir, connections, spec=spec
+                )
+
+            results["download_and_extract"] = time_phase(install, repeat)
+    finally:
+        fi.prompt = saved_prompt
+        os.environ.clear()
+        os.environ.update(saved_environ)
+        server.shutdown()
+        server.server_close()
+        shutil.rmtree(work_dir)
+    results["connections"] = MozillaHandler.connections
+    results["archive_bytes"] = getsize(archive)
+    results["page_bytes"] = len(MozillaHandler.page)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Benchmark the installer offline, against a local stand-in "
+        "for mozilla.org serving a synthetic Firefox archive."
+    )
+    parser.add_argument(
+        "--suite", choices=("phases", "extract"), action="append", default=None
+    )
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--file-size", type=int, default=1024 * 1024)
+    parser.add_argument("--compression", choices=("xz", "bz2"), action="append")
+    parser.add_argument(
+        "--workers", type=int, default=firefox_installer.EXTRACT_WORKERS
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--connections", type=int, default=4)
+    parser.add_argument("--page-languages", type=int, default=100)
+    parser.add_argument(
+        "--page", help="recorded copy of the download page to serve instead"
+    )
+    args = parser.parse_args()
+    suites = args.suite or ["phases", "extract"]
+
+    work_dir = mkdtemp()
+    try:
+        make_tree(work_dir, args.files, args.file_size)
+        results = {}
+        for compression in args.compression or ["xz", "bz2"]:
+            archive = make_archive(
+                work_dir, path_join(work_dir, "firefox.tar"), compression
+            )
+            results[compression] = {}
+            if "phases" in suites:
+                results[compression]["phases"] = bench_phases(
+                    archive,
+                    args.page_languages,
+                    args.page,
+                    args.connections,
+                    args.repeat,
+                )
+            if "extract" in suites:
+                results[compression]["extract"] = bench_extract(
+                    archive, args.workers, args.repeat
+                )
+            os.remove(archive)
+    finally:
+        shutil.rmtree(work_dir)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
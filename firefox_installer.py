@@ -1,16 +1,71 @@
 #!/usr/bin/env python3
 
+import argparse
+import cProfile
+import ctypes
+import errno
+import fcntl
+import hashlib
+import json
+import re
 import shutil
+import sqlite3
+import ssl
+import subprocess
+import sys
 import tarfile
-from base64 import b64decode
-from os import environ, makedirs
-from os.path import dirname, expanduser, isdir
+import threading
+import time
+from base64 import b64encode
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing, contextmanager, redirect_stdout
+from http.client import HTTPConnection, HTTPException, HTTPSConnection
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from hashlib import sha1, sha256, sha512
+from os import (
+    POSIX_FADV_WILLNEED,
+    chmod,
+    cpu_count,
+    environ,
+    fsencode,
+    link,
+    listdir,
+    lstat,
+    makedirs,
+    posix_fadvise,
+    remove,
+    rename,
+    replace,
+    rmdir,
+    sep,
+    strerror,
+    symlink,
+    utime,
+    walk,
+)
+from os.path import (
+    basename,
+    dirname,
+    expanduser,
+    getsize,
+    isabs,
+    isdir,
+    isfile,
+    islink,
+    normpath,
+    realpath,
+)
 from os.path import join as path_join
-from tempfile import NamedTemporaryFile, mkdtemp
-from typing import Any, List, Tuple, Union
-from urllib.request import urlopen
+from stat import S_IMODE, S_ISREG
+from tempfile import mkdtemp, mkstemp
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+from urllib.parse import parse_qs, unquote, urlencode, urljoin, urlsplit, urlunsplit
+from urllib.error import HTTPError, URLError
+from urllib.request import getproxies, proxy_bypass
 
-from lxml.html import parse
+from lxml.etree import HTMLPullParser
+
+from mkdesktop_data import data as desktop_template
 
 
 def get_xdg_data_home() -> str:
@@ -20,14 +75,526 @@ def get_xdg_data_home() -> str:
         return expanduser("~/.local/share")
 
 
-def parsed_download_page() -> Any:
-    with NamedTemporaryFile() as fp:
-        print("Downloading and parsing the download page...")
-        with urlopen("https://www.mozilla.org/en-US/firefox/all/") as resp:
-            shutil.copyfileobj(resp, fp)
-        _parse_ret = parse(fp.name)
+def get_xdg_cache_home() -> str:
+    try:
+        return environ["XDG_CACHE_HOME"]
+    except KeyError:
+        return expanduser("~/.cache")
+
+
+def get_install_root() -> str:
+    return path_join(get_xdg_data_home(), "rany2_firefox_installer")
+
+
+class Metrics:
+    """Wall and CPU time spent in each phase, and the throughput of downloads."""
+
+    def __init__(self):
+        self.phases: Dict[str, Dict[str, float]] = {}
+        self.downloads: List[Dict[str, Any]] = []
+        self.show_progress = sys.stderr.isatty()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._start = (time.perf_counter(), time.process_time())
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[Dict[str, float]]:
+        """Time a phase, leaving out the phases nested in it on the same thread.
+
+        CPU time is that of the whole process while the phase ran. The yielded
+        dict takes the number of bytes the phase handled.
+        """
+        stack = self._local.__dict__.setdefault("stack", [])
+        frame = {"bytes": 0, "nested_wall": 0.0, "nested_cpu": 0.0}
+        stack.append(frame)
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield frame
+        finally:
+            wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+            stack.pop()
+            if stack:
+                stack[-1]["nested_wall"] += wall
+                stack[-1]["nested_cpu"] += cpu
+            with self._lock:
+                entry = self.phases.setdefault(
+                    name, {"wall": 0.0, "cpu": 0.0, "bytes": 0}
+                )
+                entry["wall"] += wall - frame["nested_wall"]
+                entry["cpu"] += cpu - frame["nested_cpu"]
+                entry["bytes"] += frame["bytes"]
+
+    def record_download(self, url: str, nbytes: int, wall: float) -> None:
+        with self._lock:
+            self.downloads.append(
+                {
+                    "url": url,
+                    "host": urlsplit(url).netloc,
+                    "bytes": nbytes,
+                    "wall": wall,
+                    "bytes_per_second": nbytes / wall if wall > 0 else None,
+                }
+            )
+
+    def as_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "wall": time.perf_counter() - self._start[0],
+                "cpu": time.process_time() - self._start[1],
+                "phases": {name: dict(entry) for name, entry in self.phases.items()},
+                "downloads": list(self.downloads),
+                "http": SESSION.get_stats(),
+            }
+
+
+METRICS = Metrics()
+PROGRESS_INTERVAL = 0.5
+
+
+def format_duration(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    return f"{minutes}:{seconds:02d}"
+
+
+class Progress:
+    """Bytes done, rate and ETA of a transfer, redrawn in place on stderr."""
+
+    def __init__(self, label: str, total: int = 0, done: int = 0):
+        self.label = label
+        self.total = total
+        self.done = done
+        self._initial = done
+        self._start = time.monotonic()
+        self._last_draw = self._start
+        self._drawn = False
+        self._lock = threading.Lock()
+
+    def update(self, nbytes: int) -> None:
+        with self._lock:
+            self.done += nbytes
+            now = time.monotonic()
+            if METRICS.show_progress and now - self._last_draw >= PROGRESS_INTERVAL:
+                self._draw(now)
+
+    def close(self) -> None:
+        with self._lock:
+            # Nothing is drawn for transfers that finished within the interval.
+            if self._drawn:
+                self._draw(time.monotonic())
+                sys.stderr.write("\n")
+                sys.stderr.flush()
+                self._drawn = False
+
+    def _draw(self, now: float) -> None:
+        rate = (self.done - self._initial) / max(now - self._start, 1e-6)
+        line = f"{self.label}: {self.done / 1024 / 1024:.1f}"
+        if self.total:
+            line += f" of {self.total / 1024 / 1024:.1f}"
+        line += f" MiB, {rate / 1024 / 1024:.1f} MiB/s"
+        if self.total and rate > 0:
+            line += f", ETA {format_duration(max(self.total - self.done, 0) / rate)}"
+        sys.stderr.write(f"\r\x1b[K{line}")
+        sys.stderr.flush()
+        self._last_draw = now
+        self._drawn = True
+
+
+class MeteredReader:
+    """File-like wrapper charging reads to a phase and reporting progress."""
+
+    def __init__(
+        self,
+        fileobj: Any,
+        phase: Optional[str] = None,
+        progress: Optional[Progress] = None,
+    ):
+        self.fileobj = fileobj
+        self.phase = phase
+        self.progress = progress
+        self.nbytes = 0
+        self.wall = 0.0
+
+    def read(self, size: int = -1) -> bytes:
+        start = time.perf_counter()
+        if self.phase is None:
+            data = self.fileobj.read(size)
+        else:
+            with METRICS.phase(self.phase) as frame:
+                data = self.fileobj.read(size)
+                frame["bytes"] = len(data)
+        self.wall += time.perf_counter() - start
+        self.nbytes += len(data)
+        if self.progress is not None:
+            self.progress.update(len(data))
+        return data
+
+
+HTTP_TIMEOUT = 30.0
+HTTP_RETRIES = 3
+HTTP_BACKOFF = 0.5
+HTTP_POOL_SIZE = 8
+HTTP_MAX_REDIRECTS = 10
+HTTP_DRAIN_LIMIT = 64 * 1024
+# Temporary redirects are only remembered this long, the bouncer sends
+# download.mozilla.org links to a new build after each release.
+HTTP_REDIRECT_CACHE_TTL = 10 * 60
+REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class HTTPResponse:
+    """A response from HTTPSession.
+
+    Its connection goes back to the pool once the body has been read.
+    """
+
+    def __init__(
+        self, session: "HTTPSession", key: Any, conn: Any, resp: Any, url: str
+    ):
+        self.status = resp.status
+        self.reason = resp.reason
+        self.headers = resp.headers
+        self.url = url
+        self._session = session
+        self._key = key
+        self._conn = conn
+        self._resp = resp
+
+    def geturl(self) -> str:
+        return self.url
+
+    def read(self, size: Optional[int] = -1) -> bytes:
+        if self._conn is None:
+            return b""
+        try:
+            if size is None or size < 0:
+                data = self._resp.read()
+            else:
+                data = self._resp.read(size)
+        except BaseException:
+            self._conn.close()
+            self._conn = None
+            raise
+        if self._resp.isclosed():
+            self.close()
+        return data
+
+    def close(self) -> None:
+        if self._conn is None:
+            return
+        conn, self._conn = self._conn, None
+        # Reading the rest of a short body is cheaper than a new connection.
+        # A body of unknown length, chunked or up to the end of the
+        # connection, could be of any size and is never drained.
+        length = self._resp.length
+        if (
+            not self._resp.isclosed()
+            and length is not None
+            and length <= HTTP_DRAIN_LIMIT
+            and not self._resp.will_close
+        ):
+            try:
+                self._resp.read()
+            except (HTTPException, OSError):
+                pass
+        if self._resp.isclosed() and not self._resp.will_close:
+            self._session.release(self._key, conn)
+        else:
+            self._resp.close()
+            conn.close()
+
+    def __enter__(self) -> "HTTPResponse":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+
+class HTTPSession:
+    """Keep-alive HTTP(S) connections pooled per host, for every request made.
+
+    Requests are retried with exponential backoff on connection errors and
+    on 429 and 5xx responses. Redirects are followed and remembered, so that
+    following a bouncer link again goes straight to where it led. Errors are
+    raised as urllib's HTTPError and URLError.
+    """
+
+    def __init__(
+        self,
+        timeout: float = HTTP_TIMEOUT,
+        retries: int = HTTP_RETRIES,
+        backoff: float = HTTP_BACKOFF,
+    ):
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.connections_opened = 0
+        self.requests = 0
+        self.redirect_cache_hits = 0
+        self._pool: Dict[Any, List[Any]] = {}
+        self._redirects: Dict[str, Tuple[str, Optional[float]]] = {}
+        self._context = ssl.create_default_context()
+        self._lock = threading.Lock()
+
+    def open(
+        self,
+        url: str,
+        method: str = "GET",
+        headers: Optional[Dict[str, str]] = None,
+        follow_redirects: bool = True,
+    ) -> HTTPResponse:
+        for _ in range(HTTP_MAX_REDIRECTS + 1):
+            if follow_redirects:
+                url = self.get_cached_redirect(url)
+            resp = self._send(url, method, headers or {})
+            location = resp.headers.get("Location")
+            if resp.status not in REDIRECT_STATUSES or location is None:
+                break
+            location = urljoin(url, location)
+            self._cache_redirect(url, location, resp.status)
+            if not follow_redirects:
+                return resp
+            resp.close()
+            if resp.status == 303 and method != "HEAD":
+                method = "GET"
+            url = location
+        else:
+            raise HTTPError(url, resp.status, "Too many redirects", resp.headers, None)
+        if resp.status >= 300:
+            resp.close()
+            raise HTTPError(url, resp.status, resp.reason, resp.headers, None)
+        return resp
+
+    def get_cached_redirect(self, url: str) -> str:
+        """Return where url is known to lead to, or url itself."""
+        with self._lock:
+            for _ in range(HTTP_MAX_REDIRECTS):
+                location, expires = self._redirects.get(url, (None, None))
+                if location is None:
+                    break
+                if expires is not None and time.monotonic() > expires:
+                    del self._redirects[url]
+                    break
+                self.redirect_cache_hits += 1
+                url = location
+        return url
+
+    def _cache_redirect(self, url: str, location: str, status: int) -> None:
+        expires = None
+        if status not in (301, 308):
+            expires = time.monotonic() + HTTP_REDIRECT_CACHE_TTL
+        with self._lock:
+            self._redirects[url] = (location, expires)
+
+    def _send(self, url: str, method: str, headers: Dict[str, str]) -> HTTPResponse:
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https"):
+            raise URLError(f"unknown url type: {parts.scheme}")
+        proxy = None
+        if not proxy_bypass(parts.hostname or ""):
+            proxy = getproxies().get(parts.scheme)
+        key = (parts.scheme, parts.netloc, proxy)
+        target = urlunsplit(("", "", parts.path or "/", parts.query, ""))
+        headers = {"User-Agent": "rany2_firefox_installer", **headers}
+        if proxy is not None and parts.scheme == "http":
+            # Plain HTTP goes to the proxy with the full URL as the target.
+            target = urlunsplit((parts.scheme, parts.netloc, target, "", ""))
+            headers.update(self._proxy_headers(proxy))
+
+        delay = self.backoff
+        attempt = 0
+        while True:
+            conn, reused = self._checkout(key, parts)
+            try:
+                conn.request(method, target, headers=headers)
+                resp = HTTPResponse(self, key, conn, conn.getresponse(), url)
+            except (HTTPException, OSError) as e:
+                conn.close()
+                if reused:
+                    # The server closed an idle keep-alive connection.
+                    continue
+                if attempt >= self.retries:
+                    raise URLError(e) from e
+            else:
+                with self._lock:
+                    self.requests += 1
+                if resp.status not in RETRY_STATUSES or attempt >= self.retries:
+                    return resp
+                resp.close()
+                retry_after = resp.headers.get("Retry-After", "")
+                if retry_after.isdigit():
+                    delay = max(delay, float(retry_after))
+            time.sleep(delay)
+            delay *= 2
+            attempt += 1
+
+    def _proxy_headers(self, proxy: str) -> Dict[str, str]:
+        parts = urlsplit(proxy)
+        if parts.username is None:
+            return {}
+        credentials = f"{unquote(parts.username)}:{unquote(parts.password or '')}"
+        return {
+            "Proxy-Authorization": "Basic "
+            + b64encode(credentials.encode("utf-8")).decode("ascii")
+        }
+
+    def _checkout(self, key: Any, parts: Any) -> Tuple[Any, bool]:
+        with self._lock:
+            idle = self._pool.get(key)
+            if idle:
+                return idle.pop(), True
+            self.connections_opened += 1
+        scheme, _, proxy = key
+        host, port = parts.hostname, parts.port
+        if proxy is not None:
+            proxy_parts = urlsplit(proxy)
+            host, port = proxy_parts.hostname, proxy_parts.port
+        if scheme == "https":
+            conn = HTTPSConnection(
+                host, port, timeout=self.timeout, context=self._context
+            )
+            if proxy is not None:
+                conn.set_tunnel(parts.hostname, parts.port, self._proxy_headers(proxy))
+        else:
+            conn = HTTPConnection(host, port, timeout=self.timeout)
+        return conn, False
+
+    def release(self, key: Any, conn: Any) -> None:
+        with self._lock:
+            idle = self._pool.setdefault(key, [])
+            if len(idle) < HTTP_POOL_SIZE:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "connections_opened": self.connections_opened,
+                "requests": self.requests,
+                "redirect_cache_hits": self.redirect_cache_hits,
+            }
+
+
+SESSION = HTTPSession()
+
+
+DOWNLOAD_PAGE_URL = "https://www.mozilla.org/en-US/firefox/all/"
+DOWNLOAD_PAGE_MAX_AGE = 60 * 60
+
+
+def build_download_index(fp: Any) -> Dict[str, Any]:
+    # A single incremental pass over the page: elements are dropped as soon as
+    # they are closed, so the whole DOM is never held in memory.
+    index = {"products": [], "platforms": {}, "languages": {}, "hrefs": {}}
+    parser = HTMLPullParser(events=("start", "end"))
+    options = None
+    hrefs = None
+    languages = []
+
+    def handle(event: str, el: Any) -> None:
+        nonlocal options, hrefs
+        if event == "start":
+            if el.tag == "select":
+                select_id = el.get("id", "")
+                match = re.fullmatch(r"select_(.+)_(platform|language)", select_id)
+                if select_id == "select-product":
+                    options = index["products"]
+                elif match:
+                    options = index[f"{match.group(2)}s"].setdefault(match.group(1), [])
+            elif el.tag == "option" and options is not None and el.values():
+                options.append(el.values()[0])
+            elif el.tag == "ol" and el.get("data-product") is not None:
+                hrefs = index["hrefs"].setdefault(el.get("data-product"), {})
+            elif el.tag == "li":
+                languages.append(el.get("data-language"))
+            elif (
+                el.tag == "a"
+                and hrefs is not None
+                and el.get("data-link-type") == "download"
+                and el.get("data-download-version") is not None
+                and el.get("href") is not None
+            ):
+                language = next((x for x in reversed(languages) if x), None)
+                if language is not None:
+                    hrefs.setdefault(el.get("data-download-version"), {})[language] = (
+                        el.get("href")
+                    )
+        else:
+            if el.tag == "select":
+                options = None
+            elif el.tag == "ol":
+                hrefs = None
+            elif el.tag == "li" and languages:
+                languages.pop()
+            el.clear()
+            while el.getprevious() is not None:
+                del el.getparent()[0]
+
+    while True:
+        chunk = fp.read(64 * 1024)
+        if not chunk:
+            break
+        parser.feed(chunk)
+        for event, el in parser.read_events():
+            handle(event, el)
+    parser.close()
+    for event, el in parser.read_events():
+        handle(event, el)
+    return index
+
+
+def parsed_download_page(
+    url: str = DOWNLOAD_PAGE_URL, max_age: float = DOWNLOAD_PAGE_MAX_AGE
+) -> Dict[str, Any]:
+    index_path = path_join(get_cache_dir(), "download_page.json")
+    try:
+        with open(index_path, "r", encoding="utf-8") as fp:
+            cached = json.load(fp)
+        if cached.get("url") != url:
+            cached = None
+    except (OSError, ValueError):
+        cached = None
+
+    if cached is not None and time.time() - cached["fetched_at"] < max_age:
+        print("Using the cached download page index.")
+        return cached["index"]
+
+    headers = {}
+    if cached is not None:
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
+
+    print("Downloading and parsing the download page...")
+    try:
+        with METRICS.phase("page_fetch"), SESSION.open(url, headers=headers) as resp:
+            with METRICS.phase("page_parse"):
+                index = build_download_index(MeteredReader(resp, "page_fetch"))
+            cached = {
+                "url": url,
+                "etag": resp.headers.get("ETag"),
+                "last_modified": resp.headers.get("Last-Modified"),
+                "index": index,
+            }
         print("Download page was downloaded and parsed.")
-        return _parse_ret
+    except HTTPError as e:
+        if e.code != 304 or cached is None:
+            raise
+        print("Download page has not changed since it was last parsed.")
+    except URLError:
+        if cached is None:
+            raise
+        print("Download page could not be fetched, using the cached index.")
+        return cached["index"]
+
+    cached["fetched_at"] = time.time()
+    makedirs(dirname(index_path), exist_ok=True)
+    with open(f"{index_path}.tmp", "w", encoding="utf-8") as fp:
+        json.dump(cached, fp)
+    replace(f"{index_path}.tmp", index_path)
+    return cached["index"]
 
 
 def prompt(prompt_text: str, array: Union[List[str], Tuple[str]]) -> str:
@@ -52,75 +619,1410 @@ def prompt(prompt_text: str, array: Union[List[str], Tuple[str]]) -> str:
             return y
 
 
-def get_product_selection(doc: Any) -> str:
+def get_product_selection(index: Dict[str, Any]) -> str:
     product_options = []
-    for x in doc.xpath('//select[@id="select-product"]//option'):
-        if x.values()[0].startswith("desktop_"):
-            product_options.append(x.values()[0])
+    for x in index["products"]:
+        if x.startswith("desktop_"):
+            product_options.append(x)
     return prompt("Pick a product:", product_options)
 
 
-def get_platform_selection(doc: Any, product_select: str) -> str:
+def get_platform_selection(index: Dict[str, Any], product_select: str) -> str:
     platform_options = []
-    for x in doc.xpath(f'//select[@id="select_{product_select}_platform"]//option'):
-        if x.values()[0].startswith("linux"):
-            platform_options.append(x.values()[0])
+    for x in index["platforms"].get(product_select, []):
+        if x.startswith("linux"):
+            platform_options.append(x)
     return prompt("Pick a platform:", platform_options)
 
 
-def get_language_selection(doc: Any, product_select: str) -> str:
+def get_language_selection(index: Dict[str, Any], product_select: str) -> str:
     language_options = []
-    for x in doc.xpath(f'//select[@id="select_{product_select}_language"]//option'):
-        language_options.append(x.values()[0])
+    for x in index["languages"].get(product_select, []):
+        language_options.append(x)
     return prompt("Pick a language:", language_options)
 
 
 def get_current_href(
-    doc: Any, product_select: str, language_select: str, platform_select: str
-) -> str:
-    for x in doc.xpath(
-        f'//ol [@data-product="{product_select}"] //li[@data-language="{language_select}"]//a'
+    index: Dict[str, Any],
+    product_select: str,
+    language_select: str,
+    platform_select: str,
+) -> Optional[str]:
+    return (
+        index["hrefs"]
+        .get(product_select, {})
+        .get(platform_select, {})
+        .get(language_select)
+    )
+
+
+STREAMABLE_SUFFIXES = (".tar.bz2", ".tar.xz", ".tar.gz", ".tar")
+STREAMABLE_CONTENT_TYPES = (
+    "application/x-tar",
+    "application/x-bzip2",
+    "application/x-xz",
+    "application/gzip",
+    "application/x-gzip",
+)
+
+
+def can_stream(resp: Any) -> bool:
+    if resp.status != 200:
+        return False
+    if resp.geturl().split("?")[0].endswith(STREAMABLE_SUFFIXES):
+        return True
+    content_type = resp.headers.get("Content-Type", "").split(";")[0].strip()
+    return content_type in STREAMABLE_CONTENT_TYPES
+
+
+EXTRACT_WORKERS = min(8, cpu_count() or 1)
+EXTRACT_MAX_PENDING_BYTES = 256 * 1024 * 1024
+MAGIC_NUMBERS = ((b"BZh", "bz2"), (b"\xfd7zXZ\x00", "xz"), (b"\x1f\x8b", "gz"))
+# Multi-threaded decompressors, tried in order. xz itself only decompresses
+# in parallel since 5.4 and only for multi-block archives.
+PARALLEL_DECOMPRESSORS = {
+    "bz2": (["lbzip2", "-d", "-c"], ["pbzip2", "-d", "-c"]),
+    "xz": (["xz", "-T0", "-d", "-c"], ["pixz", "-d"]),
+    "gz": (["pigz", "-d", "-c"],),
+}
+
+
+class UnsafeArchiveError(Exception):
+    pass
+
+
+class PrefixedReader:
+    """File-like object that replays bytes peeked from fileobj before the rest."""
+
+    def __init__(self, prefix: bytes, fileobj: Any):
+        self.prefix = prefix
+        self.fileobj = fileobj
+
+    def read(self, size: int = -1) -> bytes:
+        if not self.prefix:
+            return self.fileobj.read(size)
+        if size < 0:
+            data = self.prefix + self.fileobj.read()
+        elif size <= len(self.prefix):
+            data = self.prefix[:size]
+            self.prefix = self.prefix[size:]
+            return data
+        else:
+            data = self.prefix + self.fileobj.read(size - len(self.prefix))
+        self.prefix = b""
+        return data
+
+
+class ExternalDecompressor:
+    """Decompresses fileobj with an external program fed from a thread."""
+
+    def __init__(self, command: List[str], fileobj: Any):
+        self.command = command
+        self.fileobj = fileobj
+        self.error = None
+        self.proc = subprocess.Popen(
+            command, stdin=subprocess.PIPE, stdout=subprocess.PIPE
+        )
+        self.stdout = self.proc.stdout
+        self.feeder = threading.Thread(target=self._feed)
+        self.feeder.start()
+
+    def _feed(self) -> None:
+        try:
+            while True:
+                chunk = self.fileobj.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                self.proc.stdin.write(chunk)
+        except BrokenPipeError:
+            pass
+        except Exception as e:
+            self.error = e
+        finally:
+            try:
+                self.proc.stdin.close()
+            except BrokenPipeError:
+                pass
+
+    def finish(self) -> None:
+        # The tar end-of-archive marker may come before the end of the stream.
+        while self.stdout.read(CHUNK_SIZE):
+            pass
+        self.feeder.join()
+        self.proc.wait()
+        if self.error is not None:
+            raise self.error
+        if self.proc.returncode != 0:
+            raise tarfile.ReadError(
+                f"{self.command[0]} exited with {self.proc.returncode}"
+            )
+
+    def abort(self) -> None:
+        self.proc.kill()
+        self.stdout.close()
+        self.feeder.join()
+        self.proc.wait()
+
+
+def find_decompressor(compression: Optional[str]) -> Optional[List[str]]:
+    for command in PARALLEL_DECOMPRESSORS.get(compression, ()):
+        if shutil.which(command[0]):
+            return command
+    return None
+
+
+def open_tar_stream(
+    fileobj: Any, use_external: bool = True
+) -> Tuple[tarfile.TarFile, Optional[ExternalDecompressor]]:
+    prefix = fileobj.read(6)
+    reader = PrefixedReader(prefix, fileobj)
+    compression = next((c for m, c in MAGIC_NUMBERS if prefix.startswith(m)), None)
+    command = find_decompressor(compression) if use_external else None
+    if command is None:
+        return tarfile.open(fileobj=reader, mode="r|*"), None
+
+    decompressor = ExternalDecompressor(command, reader)
+    try:
+        return tarfile.open(fileobj=decompressor.stdout, mode="r|"), decompressor
+    except BaseException:
+        decompressor.abort()
+        raise
+
+
+def get_safe_target(dest: str, real_dest: str, name: str) -> str:
+    name = normpath(name)
+    if isabs(name) or name == ".." or name.startswith(f"..{sep}"):
+        raise UnsafeArchiveError(f"Refusing to extract {name} outside of {dest}")
+    target = path_join(dest, name)
+    # A symlink extracted earlier must not redirect later members elsewhere.
+    parent = realpath(dirname(target))
+    if parent != real_dest and not parent.startswith(real_dest + sep):
+        raise UnsafeArchiveError(f"Refusing to extract {name} through a symlink")
+    return target
+
+
+def strip_name(name: str, strip_components: int) -> Optional[str]:
+    parts = normpath(name).split(sep)[strip_components:]
+    return path_join(*parts) if parts else None
+
+
+def remove_existing(target: str) -> None:
+    if islink(target) or isfile(target):
+        remove(target)
+
+
+def write_member(
+    target: str,
+    data: bytes,
+    mode: int,
+    mtime: float,
+    previous: Optional[List[Any]] = None,
+    link_source: Optional[str] = None,
+) -> Tuple[int, str, bool]:
+    """Write data to target unless the recorded previous [size, sha256] matches.
+
+    A matching target is left alone. When extracting into a fresh directory,
+    link_source names the matching file of the current installation, which
+    is hardlinked instead.
+
+    Returns the size, the SHA-256 and whether the file was written.
+    """
+    digest = sha256(data).hexdigest()
+    if previous == [len(data), digest]:
+        if link_source is None:
+            # A target whose mode differs is replaced below rather than
+            # changed in place, its inode may be shared with a snapshot.
+            if (
+                not islink(target)
+                and isfile(target)
+                and getsize(target) == len(data)
+                and S_IMODE(lstat(target).st_mode) == mode
+            ):
+                return len(data), digest, False
+        elif (
+            not islink(link_source)
+            and isfile(link_source)
+            and getsize(link_source) == len(data)
+            and S_IMODE(lstat(link_source).st_mode) == mode
+        ):
+            try:
+                link(link_source, target)
+                return len(data), digest, False
+            except OSError:
+                pass
+
+    # Replace rather than overwrite, a running Firefox may have target mapped.
+    temp_target = f"{target}.rany2-extracting"
+    with open(temp_target, "wb") as fp:
+        fp.write(data)
+    chmod(temp_target, mode)
+    utime(temp_target, (mtime, mtime))
+    if islink(target):
+        remove(target)
+    replace(temp_target, target)
+    return len(data), digest, True
+
+
+def extract_tar(
+    tar: tarfile.TarFile,
+    decompressor: Optional[ExternalDecompressor],
+    dest: str,
+    workers: int = EXTRACT_WORKERS,
+    strip_components: int = 0,
+    previous: Optional[Dict[str, List[Any]]] = None,
+    link_from: Optional[str] = None,
+) -> Tuple[Dict[str, List[Any]], int]:
+    """Extract a stream-mode tar, handing file writes to a pool of workers.
+
+    Members are checked to stay inside dest, setuid/setgid and group/other
+    write bits are dropped, and device files are skipped. Regular files whose
+    [size, sha256] in previous match are left alone, or hardlinked from
+    link_from if that is where previous was extracted to.
+
+    Returns the [size, sha256] of every regular file by its path relative to
+    dest, and the number of files that were written.
+    """
+    real_dest = realpath(dest)
+    manifest = {}
+    pending = {}
+    directories = []
+    budget = threading.Condition()
+    in_flight = 0
+    written = 0
+    previous = previous or {}
+
+    def release(nbytes: int) -> None:
+        nonlocal in_flight
+        with budget:
+            in_flight -= nbytes
+            budget.notify_all()
+
+    def collect(name: str) -> None:
+        nonlocal written
+        size, digest, was_written = pending.pop(name).result()
+        manifest[name] = [size, digest]
+        written += was_written
+
+    pool = ThreadPoolExecutor(max_workers=workers)
+    try:
+        with tar:
+            for member in tar:
+                name = strip_name(member.name, strip_components)
+                if name is None:
+                    continue
+                target = get_safe_target(dest, real_dest, name)
+                if member.isdir():
+                    makedirs(target, exist_ok=True)
+                    directories.append((target, member))
+                    continue
+                makedirs(dirname(target), exist_ok=True)
+                if name in pending:
+                    collect(name)
+                manifest.pop(name, None)
+
+                if member.isreg():
+                    data = tar.extractfile(member).read()
+                    with budget:
+                        budget.wait_for(
+                            lambda: in_flight == 0
+                            or in_flight + len(data) <= EXTRACT_MAX_PENDING_BYTES
+                        )
+                        in_flight += len(data)
+                    future = pool.submit(
+                        write_member,
+                        target,
+                        data,
+                        member.mode & 0o755,
+                        member.mtime,
+                        previous.get(name),
+                        None if link_from is None else path_join(link_from, name),
+                    )
+                    future.add_done_callback(lambda _, n=len(data): release(n))
+                    pending[name] = future
+                elif member.issym():
+                    # Resolved from where the link really is, as its parent
+                    # may itself be reached through an earlier symlink.
+                    link_target = normpath(
+                        path_join(realpath(dirname(target)), member.linkname)
+                    )
+                    if isabs(member.linkname) or (
+                        link_target != real_dest
+                        and not link_target.startswith(real_dest + sep)
+                    ):
+                        raise UnsafeArchiveError(
+                            f"Refusing to create {member.name} pointing outside "
+                            f"of {dest}"
+                        )
+                    remove_existing(target)
+                    symlink(member.linkname, target)
+                elif member.islnk():
+                    source_name = strip_name(member.linkname, strip_components)
+                    if source_name is None:
+                        continue
+                    source = get_safe_target(dest, real_dest, source_name)
+                    if source_name in pending:
+                        collect(source_name)
+                    remove_existing(target)
+                    link(source, target)
+                    if source_name in manifest:
+                        manifest[name] = manifest[source_name]
+
+            for name in list(pending):
+                collect(name)
+        # Directory modes last, so a read-only directory can still be filled.
+        for target, member in reversed(directories):
+            chmod(target, member.mode & 0o755)
+            utime(target, (member.mtime, member.mtime))
+        if decompressor is not None:
+            decompressor.finish()
+    except BaseException:
+        if decompressor is not None:
+            decompressor.abort()
+        raise
+    finally:
+        pool.shutdown(wait=True)
+    return manifest, written
+
+
+def remove_stale_files(
+    extract_dir: str, previous: Dict[str, List[Any]], manifest: Dict[str, List[Any]]
+) -> int:
+    removed = 0
+    for name in previous.keys() - manifest.keys():
+        path = path_join(extract_dir, name)
+        if isfile(path) or islink(path):
+            remove(path)
+            removed += 1
+        # Drop directories that are left empty, up to the install root.
+        parent = dirname(path)
+        try:
+            while parent != extract_dir:
+                rmdir(parent)
+                parent = dirname(parent)
+        except OSError:
+            pass
+    return removed
+
+
+STATE_DB_SCHEMA = """
+CREATE TABLE IF NOT EXISTS installs (
+    extract_dir TEXT PRIMARY KEY,
+    product TEXT,
+    platform TEXT,
+    language TEXT,
+    version TEXT,
+    url TEXT,
+    sha512 TEXT,
+    installed_at REAL,
+    desktop_file TEXT
+);
+CREATE TABLE IF NOT EXISTS files (
+    extract_dir TEXT NOT NULL REFERENCES installs (extract_dir) ON DELETE CASCADE,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    sha256 TEXT NOT NULL,
+    PRIMARY KEY (extract_dir, path)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS snapshots (
+    snapshot_dir TEXT PRIMARY KEY,
+    extract_dir TEXT NOT NULL,
+    version TEXT,
+    url TEXT,
+    sha512 TEXT,
+    installed_at REAL,
+    created_at REAL NOT NULL,
+    manifest TEXT
+);
+CREATE INDEX IF NOT EXISTS snapshots_extract_dir
+    ON snapshots (extract_dir, created_at);
+"""
+
+
+def connect_state_db() -> sqlite3.Connection:
+    makedirs(get_install_root(), exist_ok=True)
+    db = sqlite3.connect(path_join(get_install_root(), "installs.sqlite3"), timeout=30)
+    db.row_factory = sqlite3.Row
+    db.execute("PRAGMA journal_mode = WAL")
+    db.execute("PRAGMA foreign_keys = ON")
+    db.executescript(STATE_DB_SCHEMA)
+    return db
+
+
+def load_manifest(extract_dir: str) -> Optional[Dict[str, List[Any]]]:
+    with closing(connect_state_db()) as db:
+        rows = db.execute(
+            "SELECT path, size, sha256 FROM files WHERE extract_dir = ?",
+            (extract_dir,),
+        ).fetchall()
+    if not rows:
+        return None
+    return {row["path"]: [row["size"], row["sha256"]] for row in rows}
+
+
+def record_install(
+    extract_dir: str,
+    spec: Optional[Tuple[str, str, str]],
+    url: str,
+    digest: Optional[str],
+    manifest: Dict[str, List[Any]],
+) -> None:
+    product, platform, language = spec or (None, None, None)
+    with closing(connect_state_db()) as db, db:
+        db.execute(
+            """
+            INSERT INTO installs (
+                extract_dir, product, platform, language, version, url, sha512,
+                installed_at
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (extract_dir) DO UPDATE SET
+                product = COALESCE(excluded.product, product),
+                platform = COALESCE(excluded.platform, platform),
+                language = COALESCE(excluded.language, language),
+                version = excluded.version,
+                url = excluded.url,
+                sha512 = excluded.sha512,
+                installed_at = excluded.installed_at
+            """,
+            (
+                extract_dir,
+                product,
+                platform,
+                language,
+                get_version_from_url(url),
+                url,
+                digest,
+                time.time(),
+            ),
+        )
+        db.execute("DELETE FROM files WHERE extract_dir = ?", (extract_dir,))
+        db.executemany(
+            "INSERT INTO files (extract_dir, path, size, sha256) VALUES (?, ?, ?, ?)",
+            (
+                (extract_dir, path, size, sha256_digest)
+                for path, (size, sha256_digest) in manifest.items()
+            ),
+        )
+
+
+def record_desktop_file(
+    extract_dir: str,
+    spec: Tuple[str, str, str],
+    desktop_file: str,
+) -> None:
+    with closing(connect_state_db()) as db, db:
+        db.execute(
+            """
+            INSERT INTO installs (
+                extract_dir, product, platform, language, desktop_file
+            )
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (extract_dir) DO UPDATE SET
+                desktop_file = excluded.desktop_file
+            """,
+            (extract_dir, *spec, desktop_file),
+        )
+
+
+def get_installs(extract_dir: Optional[str] = None) -> List[Dict[str, Any]]:
+    query = """
+        SELECT installs.*, COUNT(files.path) AS file_count,
+            COALESCE(SUM(files.size), 0) AS total_size
+        FROM installs LEFT JOIN files USING (extract_dir)
+    """
+    params = ()
+    if extract_dir is not None:
+        query += " WHERE installs.extract_dir = ?"
+        params = (extract_dir,)
+    query += " GROUP BY installs.extract_dir ORDER BY installs.extract_dir"
+    with closing(connect_state_db()) as db:
+        return [dict(row) for row in db.execute(query, params)]
+
+
+SNAPSHOT_KEEP = 2
+
+
+def get_snapshots_dir(extract_dir: str) -> str:
+    return path_join(get_install_root(), ".snapshots", basename(extract_dir))
+
+
+def get_snapshots(extract_dir: str) -> List[Dict[str, Any]]:
+    """Return the snapshots of an installation, newest first."""
+    with closing(connect_state_db()) as db:
+        return [
+            dict(row)
+            for row in db.execute(
+                "SELECT * FROM snapshots WHERE extract_dir = ? "
+                "ORDER BY created_at DESC",
+                (extract_dir,),
+            )
+        ]
+
+
+def take_snapshot(extract_dir: str, tree: Optional[str] = None) -> str:
+    """Keep the installation in extract_dir as a snapshot to roll back to.
+
+    tree, if given, holds what extract_dir held until a new build was swapped
+    in, and is moved into the snapshot. Otherwise extract_dir is copied as
+    hardlinks, which updates leave intact as they replace files rather than
+    rewriting them.
+    """
+    snapshots_dir = get_snapshots_dir(extract_dir)
+    makedirs(snapshots_dir, exist_ok=True)
+    snapshot_dir = mkdtemp(dir=snapshots_dir, prefix=time.strftime("%Y%m%d-%H%M%S-"))
+    snapshot_tree = path_join(snapshot_dir, "firefox")
+    if tree is not None:
+        rename(tree, snapshot_tree)
+    else:
+        shutil.copytree(extract_dir, snapshot_tree, symlinks=True, copy_function=link)
+    install_record = next(iter(get_installs(extract_dir)), {})
+    manifest = load_manifest(extract_dir)
+    with closing(connect_state_db()) as db, db:
+        db.execute(
+            """
+            INSERT INTO snapshots (
+                snapshot_dir, extract_dir, version, url, sha512, installed_at,
+                created_at, manifest
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                snapshot_dir,
+                extract_dir,
+                install_record.get("version")
+                or read_application_version(snapshot_tree),
+                install_record.get("url"),
+                install_record.get("sha512"),
+                install_record.get("installed_at"),
+                time.time(),
+                None if manifest is None else json.dumps(manifest),
+            ),
+        )
+    return snapshot_dir
+
+
+def drop_snapshot(snapshot_dir: str) -> threading.Thread:
+    with closing(connect_state_db()) as db, db:
+        db.execute("DELETE FROM snapshots WHERE snapshot_dir = ?", (snapshot_dir,))
+    return remove_in_background(snapshot_dir)
+
+
+def gc_snapshots(extract_dir: str, keep: int) -> List[threading.Thread]:
+    """Drop all but the newest keep snapshots, removing them in the background."""
+    return [
+        drop_snapshot(snapshot["snapshot_dir"])
+        for snapshot in get_snapshots(extract_dir)[max(keep, 0) :]
+    ]
+
+
+def rollback_install(extract_dir: str, to: Optional[str] = None) -> Dict[str, Any]:
+    """Swap a snapshot back in, the current installation becoming the snapshot.
+
+    to picks a snapshot by directory name or version, the newest by default.
+    Returns the snapshot that was rolled back to.
+    """
+    snapshots = get_snapshots(extract_dir)
+    if to is not None:
+        snapshots = [
+            snapshot
+            for snapshot in snapshots
+            if to in (basename(snapshot["snapshot_dir"]), snapshot["version"])
+        ]
+    if not snapshots:
+        raise ValueError(f"No snapshot of {basename(extract_dir)} to roll back to")
+    snapshot = snapshots[0]
+
+    current = next(iter(get_installs(extract_dir)), {})
+    current_manifest = load_manifest(extract_dir)
+    with closing(connect_state_db()) as db, db:
+        db.execute(
+            """
+            INSERT INTO installs (extract_dir, version, url, sha512, installed_at)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (extract_dir) DO UPDATE SET
+                version = excluded.version,
+                url = excluded.url,
+                sha512 = excluded.sha512,
+                installed_at = excluded.installed_at
+            """,
+            (
+                extract_dir,
+                snapshot["version"],
+                snapshot["url"],
+                snapshot["sha512"],
+                snapshot["installed_at"],
+            ),
+        )
+        db.execute("DELETE FROM files WHERE extract_dir = ?", (extract_dir,))
+        if snapshot["manifest"] is not None:
+            db.executemany(
+                "INSERT INTO files (extract_dir, path, size, sha256) "
+                "VALUES (?, ?, ?, ?)",
+                (
+                    (extract_dir, path, size, sha256_digest)
+                    for path, (size, sha256_digest) in json.loads(
+                        snapshot["manifest"]
+                    ).items()
+                ),
+            )
+        db.execute(
+            """
+            UPDATE snapshots SET version = ?, url = ?, sha512 = ?,
+                installed_at = ?, created_at = ?, manifest = ?
+            WHERE snapshot_dir = ?
+            """,
+            (
+                current.get("version") or read_application_version(extract_dir),
+                current.get("url"),
+                current.get("sha512"),
+                current.get("installed_at"),
+                time.time(),
+                None if current_manifest is None else json.dumps(current_manifest),
+                snapshot["snapshot_dir"],
+            ),
+        )
+        # The directories are swapped last, inside the transaction, so a
+        # failed swap leaves the records as they were.
+        swap_into_place(path_join(snapshot["snapshot_dir"], "firefox"), extract_dir)
+    return snapshot
+
+
+def get_manifest_size(manifest: Dict[str, List[Any]]) -> int:
+    return sum(size for size, _ in manifest.values())
+
+
+def stream_extract(
+    fileobj: Any, dest: str, **options: Any
+) -> Optional[Tuple[Dict[str, List[Any]], int]]:
+    # Only a failure to open the stream means the format is not streamable,
+    # anything raised after extraction started is a genuine error.
+    try:
+        tar, decompressor = open_tar_stream(fileobj)
+    except (tarfile.ReadError, tarfile.CompressionError):
+        return None
+    return extract_tar(tar, decompressor, dest, **options)
+
+
+def extract_archive(
+    archive: str, dest: str, digest: Optional[str] = None, **options: Any
+) -> Tuple[Tuple[Dict[str, List[Any]], int], str]:
+    """Like extract_tar, also returning the SHA-512 of the archive.
+
+    The archive is only hashed while extracting if digest is not given.
+    """
+    progress = Progress("Extracting", getsize(archive))
+    with open(archive, "rb") as fp:
+        reader = MeteredReader(fp, progress=progress)
+        if digest is None:
+            reader = HashingReader(reader)
+        try:
+            result = extract_tar(*open_tar_stream(reader), dest, **options)
+            return result, reader.finish() if digest is None else digest
+        finally:
+            progress.close()
+
+
+CHUNK_SIZE = 1024 * 1024
+MIN_SEGMENT_SIZE = 4 * 1024 * 1024
+CHECKPOINT_INTERVAL = 1.0
+
+
+class RangesUnsupported(Exception):
+    pass
+
+
+class Checkpoint:
+    """Sidecar file recording which byte ranges of a download are done."""
+
+    def __init__(
+        self,
+        path: str,
+        url: str,
+        size: int,
+        segments: List[List[int]],
+        validator: Optional[str] = None,
     ):
-        is_good = -1
-        current_href = ""
-        for k, v in zip(x.keys(), x.values()):
-            if k == "data-download-version" and v == platform_select:
-                is_good += 1
-            elif k == "data-link-type" and v == "download":
-                is_good += 1
-            elif k == "href":
-                is_good += 1
-                current_href = v
-
-        if is_good == 2:
-            return current_href
-
-
-def download_and_extract(url: str, extract_dir: str) -> None:
-    with NamedTemporaryFile(mode="w+b") as fp:
+        self.path = path
+        self.url = url
+        self.size = size
+        self.segments = segments
+        self.validator = validator
+        self._lock = threading.Lock()
+        self._last_save = 0.0
+
+    @classmethod
+    def load(
+        cls, path: str, url: str, size: int, validator: Optional[str] = None
+    ) -> Optional["Checkpoint"]:
+        """Load a checkpoint, unless the file at url has changed since it was saved."""
+        try:
+            with open(path, "r", encoding="utf-8") as fp:
+                data = json.load(fp)
+        except (OSError, ValueError):
+            return None
+        if (
+            data.get("url") != url
+            or data.get("size") != size
+            or data.get("validator") != validator
+        ):
+            return None
+        return cls(path, url, size, data["segments"], validator)
+
+    def advance(self, segment: List[int], nbytes: int) -> None:
+        with self._lock:
+            segment[2] += nbytes
+            if time.monotonic() - self._last_save >= CHECKPOINT_INTERVAL:
+                self._save()
+
+    def save(self) -> None:
+        with self._lock:
+            self._save()
+
+    def _save(self) -> None:
+        with open(f"{self.path}.tmp", "w", encoding="utf-8") as fp:
+            json.dump(
+                {
+                    "url": self.url,
+                    "size": self.size,
+                    "validator": self.validator,
+                    "segments": self.segments,
+                },
+                fp,
+            )
+        replace(f"{self.path}.tmp", self.path)
+        self._last_save = time.monotonic()
+
+
+def get_validator(headers: Any) -> Optional[str]:
+    """Return what identifies this version of a file for If-Range.
+
+    If-Range only takes a strong ETag, so Last-Modified is used otherwise.
+    """
+    etag = headers.get("ETag")
+    if etag and not etag.startswith("W/"):
+        return etag
+    return headers.get("Last-Modified")
+
+
+def probe_download(url: str) -> Tuple[str, int, bool, Optional[str]]:
+    with SESSION.open(url, "HEAD") as resp:
+        size = int(resp.headers.get("Content-Length") or 0)
+        accepts_ranges = resp.headers.get("Accept-Ranges", "").lower() == "bytes"
+        return resp.geturl(), size, accepts_ranges, get_validator(resp.headers)
+
+
+def split_ranges(size: int, connections: int) -> List[List[int]]:
+    segment_size = max(-(-size // connections), MIN_SEGMENT_SIZE)
+    return [
+        [start, min(start + segment_size, size) - 1, 0]
+        for start in range(0, size, segment_size)
+    ]
+
+
+def fetch_segment(
+    url: str,
+    archive: str,
+    segment: List[int],
+    checkpoint: Checkpoint,
+    progress: Optional[Progress] = None,
+) -> None:
+    start, end, done = segment
+    if start + done > end:
+        return
+    headers = {"Range": f"bytes={start + done}-{end}"}
+    if checkpoint.validator is not None:
+        # Should the file have changed, the server sends all of it instead
+        # of a range of the new one to splice into the old.
+        headers["If-Range"] = checkpoint.validator
+    with SESSION.open(url, headers=headers) as resp, open(
+        archive, "r+b", buffering=0
+    ) as fp:
+        if resp.status != 206:
+            raise RangesUnsupported(url)
+        fp.seek(start + done)
+        while True:
+            chunk = resp.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            fp.write(chunk)
+            checkpoint.advance(segment, len(chunk))
+            if progress is not None:
+                progress.update(len(chunk))
+    if segment[0] + segment[2] <= segment[1]:
+        raise IOError(f"Connection closed early while fetching {url}")
+
+
+def single_download(url: str, archive: str, progress: Optional[Progress] = None) -> int:
+    with SESSION.open(url) as resp, open(archive, "wb") as fp:
+        reader = MeteredReader(resp, progress=progress)
+        shutil.copyfileobj(reader, fp, CHUNK_SIZE)
+        return reader.nbytes
+
+
+def ranged_download(url: str, downloads_dir: str, connections: int) -> Tuple[str, str]:
+    with METRICS.phase("download") as frame:
+        start = time.perf_counter()
+        archive, final_url, nbytes = _ranged_download(url, downloads_dir, connections)
+        frame["bytes"] = nbytes
+        METRICS.record_download(final_url, nbytes, time.perf_counter() - start)
+    return archive, final_url
+
+
+def _ranged_download(
+    url: str, downloads_dir: str, connections: int
+) -> Tuple[str, str, int]:
+    final_url, size, accepts_ranges, validator = probe_download(url)
+    makedirs(downloads_dir, exist_ok=True)
+    # Builds for different languages share a file name, so concurrent
+    # installs need the URL to tell their downloads apart.
+    archive = path_join(
+        downloads_dir,
+        f"{sha1(final_url.encode('utf-8')).hexdigest()[:16]}-"
+        f"{basename(urlsplit(final_url).path)}",
+    )
+    checkpoint_path = f"{archive}.checkpoint"
+
+    if not accepts_ranges or size <= 0:
+        print("Server does not support ranged requests, using a single connection.")
+        progress = Progress("Downloading", size)
+        try:
+            return archive, final_url, single_download(final_url, archive, progress)
+        finally:
+            progress.close()
+
+    checkpoint = Checkpoint.load(checkpoint_path, final_url, size, validator)
+    if checkpoint is None or not isfile(archive) or getsize(archive) != size:
+        checkpoint = Checkpoint(
+            checkpoint_path,
+            final_url,
+            size,
+            split_ranges(size, connections),
+            validator,
+        )
+        with open(archive, "wb") as fp:
+            fp.truncate(size)
+        checkpoint.save()
+        done = 0
+    else:
+        done = sum(segment[2] for segment in checkpoint.segments)
+        print(f"Resuming download, {done} of {size} bytes already present.")
+
+    progress = Progress("Downloading", size, done)
+    try:
+        with ThreadPoolExecutor(max_workers=connections) as executor:
+            futures = [
+                executor.submit(
+                    fetch_segment, final_url, archive, segment, checkpoint, progress
+                )
+                for segment in checkpoint.segments
+            ]
+            for future in futures:
+                future.result()
+    except RangesUnsupported:
+        print("Server ignored ranged requests, using a single connection.")
+        remove(checkpoint_path)
+        progress = Progress("Downloading", size)
+        return archive, final_url, single_download(final_url, archive, progress)
+    finally:
+        progress.close()
+        if isfile(checkpoint_path):
+            checkpoint.save()
+
+    remove(checkpoint_path)
+    return archive, final_url, size - done
+
+
+ARTIFACT_CACHE_MAX_BYTES = 2 * 1024 * 1024 * 1024
+# Serializes the cache eviction of concurrent batch installs.
+EVICTION_LOCK = threading.Lock()
+
+
+def get_cache_dir() -> str:
+    return path_join(get_xdg_cache_home(), "rany2_firefox_installer")
+
+
+def get_version_from_url(url: str) -> Optional[str]:
+    # firefox-118.0.tar.bz2, firefox-115.3.0esr.tar.bz2 or
+    # firefox-120.0a1.en-US.linux-x86_64.tar.bz2 for nightlies.
+    match = re.search(
+        r"firefox-(\d[^/]*?)(?:\.[^/.]+\.linux[^/]*)?\.tar\.[a-z0-9]+$",
+        urlsplit(url).path,
+    )
+    return match.group(1) if match else None
+
+
+def get_artifact_path(
+    cache_key: Tuple[str, str, str], url: str, identity: str = ""
+) -> Optional[str]:
+    """Return where the build at url is cached.
+
+    identity tells apart builds served from the same URL, such as the size and
+    ETag or Last-Modified of the latest nightly.
+    """
+    version = get_version_from_url(url)
+    if version is None:
+        return None
+    path = urlsplit(url).path
+    # Every nightly of a cycle has the same version and file name, only the
+    # dated build directory in the path or identity tells them apart.
+    key = f"{path}\n{identity}".encode("utf-8")
+    return path_join(
+        get_cache_dir(),
+        "artifacts",
+        *cache_key,
+        version,
+        f"{sha1(key).hexdigest()[:16]}-{basename(path)}",
+    )
+
+
+def evict_artifacts(max_bytes: int, artifacts_dir: Optional[str] = None) -> None:
+    """Remove the least recently used artifacts until the cache fits in max_bytes.
+
+    This is best effort: files that another process removed first are skipped.
+    """
+    if artifacts_dir is None:
+        artifacts_dir = path_join(get_cache_dir(), "artifacts")
+    with EVICTION_LOCK:
+        _evict_artifacts(max_bytes, artifacts_dir)
+
+
+def _evict_artifacts(max_bytes: int, artifacts_dir: str) -> None:
+    entries = []
+    for root, _, files in walk(artifacts_dir):
+        for name in files:
+            if name.endswith(".part"):
+                continue
+            path = path_join(root, name)
+            try:
+                st = lstat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        print(f"Evicting {path} from the download cache.")
+        try:
+            remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        try:
+            parent = dirname(path)
+            while parent != artifacts_dir:
+                rmdir(parent)
+                parent = dirname(parent)
+        except OSError:
+            pass
+
+
+class HashingReader:
+    """File-like wrapper computing the SHA-512 of everything read through it."""
+
+    def __init__(self, fileobj: Any):
+        self.fileobj = fileobj
+        self.hash = sha512()
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.fileobj.read(size)
+        self.hash.update(data)
+        return data
+
+    def finish(self) -> str:
+        while self.read(CHUNK_SIZE):
+            pass
+        return self.hash.hexdigest()
+
+
+class ChecksumMismatch(Exception):
+    pass
+
+
+def get_checksums_location(url: str) -> Optional[Tuple[str, str]]:
+    """Return the checksum manifest URL for a download URL and its entry name."""
+    parts = urlsplit(url)
+    # Releases: /pub/firefox/releases/118.0/linux-x86_64/en-US/firefox-118.0.tar.bz2
+    match = re.fullmatch(r"(.*/releases/[^/]+/)(.+)", parts.path)
+    if match:
+        manifest_path, name = f"{match.group(1)}SHA512SUMS", match.group(2)
+    else:
+        # Nightlies publish a firefox-120.0a1.en-US.linux-x86_64.checksums
+        # next to each tarball.
+        match = re.fullmatch(r"(.*/)(firefox-[^/]+)\.tar\.[a-z0-9]+", parts.path)
+        if not match:
+            return None
+        manifest_path = f"{match.group(1)}{match.group(2)}.checksums"
+        name = basename(parts.path)
+    return urlunsplit((parts.scheme, parts.netloc, manifest_path, "", "")), name
+
+
+def get_expected_sha512(url: str, refresh: bool = False) -> Optional[str]:
+    location = get_checksums_location(url)
+    if location is None:
+        return None
+    manifest_url, name = location
+    manifest_path = path_join(
+        get_cache_dir(),
+        "checksums",
+        f"{sha1(manifest_url.encode('utf-8')).hexdigest()[:16]}-"
+        f"{basename(manifest_url)}",
+    )
+
+    if refresh or not isfile(manifest_path):
+        makedirs(dirname(manifest_path), exist_ok=True)
+        # All builds of a release share one SHA512SUMS, so concurrent installs
+        # may fetch it at the same time; each writes its own temporary file.
+        fd, temp_path = mkstemp(
+            dir=dirname(manifest_path), prefix=f".{basename(manifest_path)}."
+        )
+        try:
+            with open(fd, "wb") as fp, SESSION.open(manifest_url) as resp:
+                shutil.copyfileobj(resp, fp)
+            replace(temp_path, manifest_path)
+        except HTTPError as e:
+            if e.code == 404:
+                return None
+            raise
+        finally:
+            if isfile(temp_path):
+                remove(temp_path)
+
+    with open(manifest_path, "r", encoding="utf-8") as fp:
+        for line in fp:
+            fields = line.split()
+            # SHA512SUMS has "<hash>  <name>", the nightly .checksums files
+            # have "<hash> <algorithm> <size> <name>" lines.
+            if len(fields) == 2 and fields[1] == name:
+                return fields[0]
+            if len(fields) == 4 and fields[1] == "sha512" and fields[3] == name:
+                return fields[0]
+    return None
+
+
+def verify_download(url: str, digest: str) -> None:
+    with METRICS.phase("verify"):
+        expected = get_expected_sha512(url)
+        if expected is None:
+            print("No SHA-512 checksum is published for this download, not verifying.")
+            return
+        if expected != digest:
+            # The cached manifest may be from an earlier build at the same URL.
+            expected = get_expected_sha512(url, refresh=True)
+    if expected != digest:
+        raise ChecksumMismatch(
+            f"SHA-512 of {url} is {digest}, but {expected} was published"
+        )
+    print("SHA-512 checksum verified.")
+
+
+class TeeReader:
+    """File-like wrapper that copies everything read from resp into a file."""
+
+    def __init__(self, resp: Any, path: str):
+        self.resp = resp
+        self.fp = open(path, "wb")
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.resp.read(size)
+        self.fp.write(data)
+        return data
+
+    def finish(self) -> None:
+        while self.read(CHUNK_SIZE):
+            pass
+        self.fp.close()
+
+    def close(self) -> None:
+        self.fp.close()
+
+
+RENAME_EXCHANGE = 2
+AT_FDCWD = -100
+
+
+def exchange_paths(a: str, b: str) -> bool:
+    """Atomically swap two paths with renameat2(2), if the system supports it."""
+    try:
+        renameat2 = ctypes.CDLL(None, use_errno=True).renameat2
+    except AttributeError:
+        return False
+    ret = renameat2(
+        AT_FDCWD, fsencode(a), AT_FDCWD, fsencode(b), ctypes.c_uint(RENAME_EXCHANGE)
+    )
+    if ret == 0:
+        return True
+    err = ctypes.get_errno()
+    if err in (errno.ENOSYS, errno.EINVAL, errno.ENOTSUP):
+        return False
+    raise OSError(err, strerror(err), b)
+
+
+def swap_into_place(new_dir: str, extract_dir: str) -> None:
+    # new_dir is left holding the old installation, if there was one.
+    if not isdir(extract_dir):
+        rename(new_dir, extract_dir)
+    elif not exchange_paths(new_dir, extract_dir):
+        old_dir = f"{new_dir}.old"
+        rename(extract_dir, old_dir)
+        rename(new_dir, extract_dir)
+        rename(old_dir, new_dir)
+
+
+def remove_in_background(path: str) -> threading.Thread:
+    # Not a daemon thread, so the interpreter finishes the cleanup before exiting.
+    thread = threading.Thread(
+        target=shutil.rmtree, args=(path,), kwargs={"ignore_errors": True}
+    )
+    thread.start()
+    return thread
+
+
+def download_and_extract(
+    url: str,
+    extract_dir: str,
+    connections: int = 1,
+    spec: Optional[Tuple[str, str, str]] = None,
+    use_cache: bool = True,
+    cache_max_bytes: int = ARTIFACT_CACHE_MAX_BYTES,
+    extract_workers: int = EXTRACT_WORKERS,
+    incremental: bool = False,
+    verify: bool = True,
+    keep_snapshots: int = SNAPSHOT_KEEP,
+) -> None:
+    downloads_dir = path_join(get_cache_dir(), "downloads")
+    artifact = None
+    if spec is not None and use_cache:
+        url, size, _, validator = probe_download(url)
+        artifact = get_artifact_path(spec, url, f"{size} {validator or ''}")
+
+    previous = None
+    if incremental and isdir(extract_dir):
+        previous = load_manifest(extract_dir)
+        if previous is None:
+            print()
+            print("The current installation has no file record, doing a full install.")
+
+    makedirs(dirname(extract_dir), exist_ok=True)
+    if previous is not None:
+        temp_extract = None
+        dest = extract_dir
+    else:
+        # Staging next to the destination keeps the final move a rename on the
+        # same filesystem instead of a copy out of /tmp.
+        temp_extract = mkdtemp(
+            dir=dirname(extract_dir), prefix=f".{basename(extract_dir)}.staging-"
+        )
+        dest = path_join(temp_extract, "firefox")
+        makedirs(dest)
+    options = {
+        "workers": extract_workers,
+        "strip_components": 1,
+        "previous": previous,
+    }
+    if previous is None and isdir(extract_dir):
+        # Files the new build shares with the current one are hardlinked from
+        # it rather than written, which also keeps snapshots small.
+        options["previous"] = load_manifest(extract_dir)
+        options["link_from"] = extract_dir
+    snapshot_dir = None
+
+    def snapshot_before_writing() -> None:
+        # An incremental update writes into the live installation. It is
+        # snapshotted only once nothing can fail before the first write, so
+        # failed downloads do not pile up copies of the current version.
+        nonlocal snapshot_dir
+        if previous is not None and keep_snapshots > 0 and snapshot_dir is None:
+            snapshot_dir = take_snapshot(extract_dir)
+
+    try:
         print()
-        print("Downloading...")
-        with urlopen(url) as resp:
-            shutil.copyfileobj(resp, fp)
-        print("Download complete.")
+        archive = None
+        digest = None
+        if artifact is not None and isfile(artifact):
+            print("Using cached download...")
+            utime(artifact)
+            archive = artifact
+        elif connections > 1 or (previous is not None and verify):
+            if connections > 1:
+                print(f"Downloading using {connections} connections...")
+            else:
+                print("Downloading...")
+            archive, url = ranged_download(url, downloads_dir, connections)
+            print("Download complete.")
+        else:
+            print("Downloading and extracting...")
+            with SESSION.open(url) as resp:
+                url = resp.geturl()
+                progress = Progress(
+                    "Downloading and extracting",
+                    int(resp.headers.get("Content-Length") or 0),
+                )
+                # Reads from the network are charged to the download phase,
+                # the rest of the time to extraction.
+                metered = MeteredReader(resp, "download", progress)
+                reader = HashingReader(metered)
+                tee = None
+                if artifact is not None:
+                    makedirs(dirname(artifact), exist_ok=True)
+                    tee = TeeReader(reader, f"{artifact}.part")
+                try:
+                    result = None
+                    if can_stream(resp):
+                        snapshot_before_writing()
+                        with METRICS.phase("extract") as frame:
+                            result = stream_extract(tee or reader, dest, **options)
+                            if result is not None:
+                                frame["bytes"] = get_manifest_size(result[0])
+                    if result is not None:
+                        if tee is not None:
+                            tee.finish()
+                        digest = reader.finish()
+                        progress.close()
+                        METRICS.record_download(url, metered.nbytes, metered.wall)
+                        if verify:
+                            verify_download(url, digest)
+                        if tee is not None:
+                            replace(f"{artifact}.part", artifact)
+                finally:
+                    progress.close()
+                    if tee is not None:
+                        tee.close()
+                        if isfile(f"{artifact}.part"):
+                            remove(f"{artifact}.part")
+
+            if result is not None:
+                print("Download and extract complete.")
+            else:
+                print("Archive can not be streamed, falling back to a full download.")
+                archive, url = ranged_download(url, downloads_dir, 1)
+                print("Download complete.")
+
+        if archive is not None:
+            try:
+                if previous is not None and verify:
+                    # An incremental update writes into the live installation,
+                    # so the archive has to be checked before extracting it.
+                    digest = file_digest(archive, "sha512")
+                    verify_download(url, digest)
+                snapshot_before_writing()
+                print()
+                print("Extracting...")
+                with METRICS.phase("extract") as frame:
+                    result, digest = extract_archive(archive, dest, digest, **options)
+                    frame["bytes"] = get_manifest_size(result[0])
+                print("Extract complete.")
+                if verify and previous is None:
+                    verify_download(url, digest)
+            except (ChecksumMismatch, tarfile.TarError):
+                # Do not keep a corrupt download around, least of all in the cache.
+                remove(archive)
+                raise
+            if archive != artifact:
+                if artifact is not None:
+                    makedirs(dirname(artifact), exist_ok=True)
+                    replace(archive, artifact)
+                else:
+                    remove(archive)
         print()
 
-        if isdir(extract_dir):
-            print("Removing old Firefox installation...")
+        manifest, written = result
+        if previous is not None:
+            removed = remove_stale_files(extract_dir, previous, manifest)
+            print(
+                f"Updated in place: {written} files written, {removed} removed, "
+                f"{len(manifest) - written} unchanged."
+            )
+        elif isdir(extract_dir):
+            print("Replacing old Firefox installation...")
             print("You will not lose your profiles or data.")
-            shutil.rmtree(extract_dir)
-            print("Old Firefox installation removed.")
+            swap_into_place(dest, extract_dir)
+            if keep_snapshots > 0:
+                snapshot_dir = take_snapshot(extract_dir, dest)
+            print("Old Firefox installation replaced.")
             print()
+        else:
+            swap_into_place(dest, extract_dir)
+        record_install(extract_dir, spec, url, digest, manifest)
+        if artifact is not None:
+            # Only after the swap, so a cache problem can not fail an install.
+            evict_artifacts(cache_max_bytes)
+        if snapshot_dir is not None and manifest == options["previous"]:
+            # Reinstalling the same build leaves nothing to roll back to.
+            drop_snapshot(snapshot_dir)
+        gc_snapshots(extract_dir, keep_snapshots)
+    finally:
+        if temp_extract is not None:
+            remove_in_background(temp_extract)
 
-        print("Extracting...")
-        try:
-            temp_extract = mkdtemp()
-            with tarfile.open(fp.name) as tar:
-                tar.extractall(temp_extract)
-            shutil.move(f"{temp_extract}/firefox", f"{extract_dir}")
-            print("Extract complete.")
-        finally:
-            shutil.rmtree(f"{temp_extract}")
+
+DESKTOP_FILE_PREFIX = "rany2_firefox_installer-"
+# Name suffix and StartupWMClass of each product.
+DESKTOP_PRODUCTS = {
+    "desktop_release": ("", "Firefox"),
+    "desktop_beta": (" Beta", "Firefox"),
+    "desktop_developer": (" Developer Edition", "Firefox Developer Edition"),
+    "desktop_nightly": (" Nightly", "Nightly"),
+    "desktop_esr": (" ESR", "Firefox"),
+}
+
+
+def parse_desktop_template(template: bytes) -> List[bytes]:
+    """Split the template into literal text alternating with placeholder names."""
+    return re.split(rb"%%%(RELEASE_TYPE|EXTRACT_DIR|WM_CLASS)%%%", template)
+
+
+DESKTOP_TEMPLATE = parse_desktop_template(desktop_template)
+
+
+def render_desktop_entry(product_select: str, extract_dir: str) -> bytes:
+    release_type, wm_class = DESKTOP_PRODUCTS.get(
+        product_select, (product_select, "Firefox")
+    )
+    values = {
+        b"RELEASE_TYPE": release_type.encode("utf-8"),
+        b"EXTRACT_DIR": extract_dir.encode("utf-8"),
+        b"WM_CLASS": wm_class.encode("utf-8"),
+    }
+    return b"".join(
+        values[part] if i % 2 else part for i, part in enumerate(DESKTOP_TEMPLATE)
+    )
+
+
+def get_applications_dir() -> str:
+    return path_join(get_xdg_data_home(), "applications")
+
+
+def get_desktop_file(
+    product_select: str, platform_select: str, language_select: str
+) -> str:
+    # noinspection SpellCheckingInspection
+    return path_join(
+        get_applications_dir(),
+        f"{DESKTOP_FILE_PREFIX}firefox_{product_select}_{platform_select}_"
+        f"{language_select}.desktop",
+    )
+
+
+def write_if_changed(path: str, data: bytes) -> bool:
+    """Atomically replace path with data, unless it already holds exactly that.
+
+    Desktop environments rescan their menus whenever an entry is written,
+    so an unchanged entry is not touched at all.
+    """
+    try:
+        if getsize(path) == len(data):
+            with open(path, "rb") as fp:
+                if fp.read() == data:
+                    return False
+    except OSError:
+        pass
+    # Not a .desktop name, so menus ignore the file until it is complete.
+    with open(f"{path}.tmp", "wb") as fp:
+        fp.write(data)
+    replace(f"{path}.tmp", path)
+    return True
 
 
 def create_desktop(
@@ -128,70 +2030,1260 @@ def create_desktop(
     platform_select: str,
     language_select: str,
     extract_dir: str,
-) -> None:
-    _release_type = product_select
-    wm_class = "Firefox"
-    if product_select == "desktop_release":
-        product_select = ""
-        wm_class = "Firefox"
-    elif product_select == "desktop_beta":
-        product_select = " Beta"
-        wm_class = "Firefox"
-    elif product_select == "desktop_developer":
-        product_select = " Developer Edition"
-        wm_class = "Firefox Developer Edition"
-    elif product_select == "desktop_nightly":
-        product_select = " Nightly"
-        wm_class = "Nightly"
-    elif product_select == "desktop_esr":
-        product_select = " ESR"
-        wm_class = "Firefox"
-
-    # noinspection SpellCheckingInspection
-    desktop_data = b64decode(
-        b"W0Rlc2t0b3AgRW50cnldClZlcnNpb249MS4wCk5hbWU9RmlyZWZveCUlJVJFTEVBU0VfVFlQRSUlJQpHZW5lcmljTmFtZT1XZWIgQnJvd3NlcgpHZW5lcmljTmFtZVthcl092YXYqti12YHYrSDZiNmQ2KgKR2VuZXJpY05hbWVbYXN0XT1SZXN0b2xhZG9yIFdlYgpHZW5lcmljTmFtZVtibl094KaT4Kav4Ka84KeH4KasIOCmrOCnjeCmsOCmvuCmieCmnOCmvuCmsApHZW5lcmljTmFtZVtjYV09TmF2ZWdhZG9yIHdlYgpHZW5lcmljTmFtZVtjc109V2Vib3bDvSBwcm9obMOtxb5lxI0KR2VuZXJpY05hbWVbZGFdPVdlYmJyb3dzZXIKR2VuZXJpY05hbWVbZGVdPVdlYmJyb3dzZXIKR2VuZXJpY05hbWVbZWxdPc6gzrXPgc65zrfOs863z4TOrs+CIM60zrnOsc60zrnOus+Ez43Ov8+FCkdlbmVyaWNOYW1lW2VzXT1OYXZlZ2Fkb3Igd2ViCkdlbmVyaWNOYW1lW2V0XT1WZWViaWJyYXVzZXIKR2VuZXJpY05hbWVbZmFdPdmF2LHZiNix2q/YsSDYp9uM2YbYqtix2YbYqtuMCkdlbmVyaWNOYW1lW2ZpXT1XV1ctc2VsYWluCkdlbmVyaWNOYW1lW2ZyXT1OYXZpZ2F0ZXVyIFdlYgpHZW5lcmljTmFtZVtnbF09TmF2ZWdhZG9yIFdlYgpHZW5lcmljTmFtZVtoZV0915PXpNeT16TXnyDXkNeZ16DXmNeo16DXmApHZW5lcmljTmFtZVtocl09V2ViIHByZWdsZWRuaWsKR2VuZXJpY05hbWVbaHVdPVdlYmLDtm5nw6lzesWRCkdlbmVyaWNOYW1lW2l0XT1Ccm93c2VyIFdlYgpHZW5lcmljTmFtZVtqYV0944Km44Kn44OW44O744OW44Op44Km44K2CkdlbmVyaWNOYW1lW2tvXT3sm7kg67iM65287Jqw7KCACkdlbmVyaWNOYW1lW2t1XT1HZXJva2EgdG9yw6oKR2VuZXJpY05hbWVbbHRdPUludGVybmV0byBuYXLFoXlrbMSXCkdlbmVyaWNOYW1lW25iXT1OZXR0bGVzZXIKR2VuZXJpY05hbWVbbmxdPVdlYmJyb3dzZXIKR2VuZXJpY05hbWVbbm5dPU5ldHRsZXNhcgpHZW5lcmljTmFtZVtub109TmV0dGxlc2VyCkdlbmVyaWNOYW1lW3BsXT1QcnplZ2zEhWRhcmthIFdXVwpHZW5lcmljTmFtZVtwdF09TmF2ZWdhZG9yIFdlYgpHZW5lcmljTmFtZVtwdF9CUl09TmF2ZWdhZG9yIFdlYgpHZW5lcmljTmFtZVtyb109TmF2aWdhdG9yIEludGVybmV0CkdlbmVyaWNOYW1lW3J1XT3QktC10LEt0LHRgNCw0YPQt9C10YAKR2VuZXJpY05hbWVbc2tdPUludGVybmV0b3bDvSBwcmVobGlhZGHEjQpHZW5lcmljTmFtZVtzbF09U3BsZXRuaSBicnNrYWxuaWsKR2VuZXJpY05hbWVbc3ZdPVdlYmJsw6RzYXJlCkdlbmVyaWNOYW1lW3RyXT1XZWIgVGFyYXnEsWPEsQpHZW5lcmljTmFtZVt1Z1092KrZiNix2YPbhtix2q/biApHZW5lcmljTmFtZVt1a1090JLQtdCxLdCx0YDQsNGD0LfQtdGACkdlbmVyaWNOYW1lW3ZpXT1UcsOsbmggZHV54buHdCBXZWIKR2VuZXJpY05hbWVbemhfQ05dPee9kee7nOa1j+iniOWZqApHZW5lcmljTmFtZVt6aF9UV10957ay6Lev54CP6Ka95ZmoCkNvbW1lbnQ9QnJvd3NlIHRoZSBXZWIKQ29tbWVudFthcl092KrYtdmB2K0g2KfZhNmI2ZDYqApDb21tZW50W2FzdF09UmVzdG9sYSBwZWxhIFJlZGUKQ29tbWVudFtibl094KaH4Kao4KeN4Kaf4Ka+4Kaw4Kao4KeH4KafIOCmrOCnjeCmsOCmvuCmieCmnCDgppXgprDgp4HgpqgKQ29tbWVudFtjYV09TmF2ZWd1ZXUgcGVyIGVsIHdlYgpDb21tZW50W2NzXT1Qcm9obMOtxb5lbsOtIHN0csOhbmVrIFdvcmxkIFdpZGUgV2VidQpDb21tZW50W2RhXT1TdXJmIHDDpSBpbnRlcm5ldHRldApDb21tZW50W2RlXT1JbSBJbnRlcm5ldCBzdXJmZW4KQ29tbWVudFtlbF09zpzPgM6/z4HOtc6vz4TOtSDOvc6xIM+AzrXPgc65zrfOs863zrjOtc6vz4TOtSDPg8+Ezr8gzrTOuc6xzrTOr866z4TPhc6/IChXZWIpCkNvbW1lbnRbZXNdPU5hdmVndWUgcG9yIGxhIHdlYgpDb21tZW50W2V0XT1MZWhpdHNlIHZlZWJpCkNvbW1lbnRbZmFdPdi12YHYrdin2Kog2LTYqNqp2Ycg2KzZh9in2YbbjCDYp9uM2YbYqtix2YbYqiDYsdinINmF2LHZiNixINmG2YXYp9uM24zYrwpDb21tZW50W2ZpXT1TZWxhYSBJbnRlcm5ldGluIFdXVy1zaXZ1amEKQ29tbWVudFtmcl09TmF2aWd1ZXIgc3VyIGxlIFdlYgpDb21tZW50W2dsXT1OYXZlZ2FyIHBvbGEgcmVkZQpDb21tZW50W2hlXT3Xktec15nXqdeUINeR16jXl9eR15kg15TXkNeZ16DXmNeo16DXmApDb21tZW50W2hyXT1QcmV0cmHFvml0ZSB3ZWIKQ29tbWVudFtodV09QSB2aWzDoWdow6Fsw7MgYsO2bmfDqXN6w6lzZQpDb21tZW50W2l0XT1Fc3Bsb3JhIGlsIHdlYgpDb21tZW50W2phXT3jgqbjgqfjg5bjgpLplrLopqfjgZfjgb7jgZkKQ29tbWVudFtrb1097Ju57J2EIOuPjOyVhCDri6Tri5nri4jri6QKQ29tbWVudFtrdV09TGkgdG9yw6ogYmlnZXJlCkNvbW1lbnRbbHRdPU5hcsWheWtpdGUgaW50ZXJuZXRlCkNvbW1lbnRbbmJdPVN1cmYgcMOlIG5ldHRldApDb21tZW50W25sXT1WZXJrZW4gaGV0IGludGVybmV0CkNvbW1lbnRbbm5dPVN1cmYgcMOlIG5ldHRldApDb21tZW50W25vXT1TdXJmIHDDpSBuZXR0ZXQKQ29tbWVudFtwbF09UHJ6ZWdsxIVkYW5pZSBzdHJvbiBXV1cKQ29tbWVudFtwdF09TmF2ZWd1ZSBuYSBJbnRlcm5ldApDb21tZW50W3B0X0JSXT1OYXZlZ3VlIG5hIEludGVybmV0CkNvbW1lbnRbcm9dPU5hdmlnYcibaSBwZSBJbnRlcm5ldApDb21tZW50W3J1XT3QlNC+0YHRgtGD0L8g0LIg0JjQvdGC0LXRgNC90LXRggpDb21tZW50W3NrXT1QcmVobGlhZGFuaWUgaW50ZXJuZXR1CkNvbW1lbnRbc2xdPUJyc2thanRlIHBvIHNwbGV0dQpDb21tZW50W3N2XT1TdXJmYSBww6Ugd2ViYmVuCkNvbW1lbnRbdHJdPcSwbnRlcm5ldCd0ZSBHZXppbmluCkNvbW1lbnRbdWddPdiv24fZhtmK2KfYr9mJ2YPZiSDYqtmI2LHYqNuV2KrZhNuV2LHZhtmJINmD24bYsdqv2YnZhNmJINio2YjZhNmJ2K/bhwpDb21tZW50W3VrXT3Qn9C10YDQtdCz0LvRj9C0INGB0YLQvtGA0ZbQvdC+0Log0IbQvdGC0LXRgNC90LXRgtGDCkNvbW1lbnRbdmldPcSQ4buDIGR1eeG7h3QgY8OhYyB0cmFuZyB3ZWIKQ29tbWVudFt6aF9DTl095rWP6KeI5LqS6IGU572RCkNvbW1lbnRbemhfVFddPeeAj+imvee2sumam+e2sui3rwpFeGVjPSUlJUVYVFJBQ1RfRElSJSUlL2ZpcmVmb3ggJXUKSWNvbj0lJSVFWFRSQUNUX0RJUiUlJS9icm93c2VyL2Nocm9tZS9pY29ucy9kZWZhdWx0L2RlZmF1bHQxMjgucG5nClRlcm1pbmFsPWZhbHNlClR5cGU9QXBwbGljYXRpb24KTWltZVR5cGU9dGV4dC9odG1sO3RleHQveG1sO2FwcGxpY2F0aW9uL3hodG1sK3htbDthcHBsaWNhdGlvbi92bmQubW96aWxsYS54dWwreG1sO3RleHQvbW1sO3gtc2NoZW1lLWhhbmRsZXIvaHR0cDt4LXNjaGVtZS1oYW5kbGVyL2h0dHBzOwpTdGFydHVwTm90aWZ5PXRydWUKU3RhcnR1cFdNQ2xhc3M9JSUlV01fQ0xBU1MlJSUKQ2F0ZWdvcmllcz1OZXR3b3JrO1dlYkJyb3dzZXI7CktleXdvcmRzPXdlYjticm93c2VyO2ludGVybmV0OwpBY3Rpb25zPW5ldy13aW5kb3c7bmV3LXByaXZhdGUtd2luZG93O3Byb2ZpbGUtbWFuYWdlci13aW5kb3c7CgpbRGVza3RvcCBBY3Rpb24gbmV3LXdpbmRvd10KTmFtZT1OZXcgV2luZG93Ck5hbWVbYWNoXT1EaXJpY2EgbWFueWVuCk5hbWVbYWZdPU51d2UgdmVuc3RlcgpOYW1lW2FuXT1OdWV2YSBmaW5lc3RyYQpOYW1lW2FyXT3Zhtin2YHYsNipINis2K/Zitiv2KkKTmFtZVthc1094Kao4Kak4KeB4KaoIOCmieCmh+CmqOCnjeCmoeCniwpOYW1lW2FzdF09VmVudGFuYSBudWV2YQpOYW1lW2F6XT1ZZW5pIFDJmW5jyZlyyZkKTmFtZVtiZV090J3QvtCy0LDQtSDQsNC60L3QvgpOYW1lW2JnXT3QndC+0LIg0L/RgNC+0LfQvtGA0LXRhgpOYW1lW2JuX0JEXT3gpqjgpqTgp4Hgpqgg4KaJ4KaH4Kao4KeN4Kah4KeLIChOKQpOYW1lW2JuX0lOXT3gpqjgpqTgp4Hgpqgg4KaJ4KaH4Kao4KeN4Kah4KeLCk5hbWVbYnJdPVByZW5lc3RyIG5ldmV6Ck5hbWVbYnJ4XT3gpJfgpYvgpKbgpL7gpKgg4KSJ4KSH4KSo4KWN4KShJyhOKQpOYW1lW2JzXT1Ob3ZpIHByb3pvcgpOYW1lW2NhXT1GaW5lc3RyYSBub3ZhCk5hbWVbY2FrXT1LJ2FrJ2EnIHR6dXfDpGNoCk5hbWVbY3NdPU5vdsOpIG9rbm8KTmFtZVtjeV09RmZlbmVzdHIgTmV3eWRkCk5hbWVbZGFdPU55dCB2aW5kdWUKTmFtZVtkZV09TmV1ZXMgRmVuc3RlcgpOYW1lW2RzYl09Tm93ZSB3b2tubwpOYW1lW2VsXT3Onc6tzr8gz4DOsc+BzqzOuM+Fz4HOvwpOYW1lW2VuX0dCXT1OZXcgV2luZG93Ck5hbWVbZW5fVVNdPU5ldyBXaW5kb3cKTmFtZVtlbl9aQV09TmV3IFdpbmRvdwpOYW1lW2VvXT1Ob3ZhIGZlbmVzdHJvCk5hbWVbZXNfQVJdPU51ZXZhIHZlbnRhbmEKTmFtZVtlc19DTF09TnVldmEgdmVudGFuYQpOYW1lW2VzX0VTXT1OdWV2YSB2ZW50YW5hCk5hbWVbZXNfTVhdPU51ZXZhIHZlbnRhbmEKTmFtZVtldF09VXVzIGFrZW4KTmFtZVtldV09TGVpaG8gYmVycmlhCk5hbWVbZmFdPdm+2YbYrNix2Ycg2KzYr9uM2K8KTmFtZVtmZl09SGVub3JkZSBIZXNlcmUKTmFtZVtmaV09VXVzaSBpa2t1bmEKTmFtZVtmcl09Tm91dmVsbGUgZmVuw6p0cmUKTmFtZVtmeV9OTF09TmlqIGZpbnN0ZXIKTmFtZVtnYV9JRV09RnVpbm5lb2cgTnVhCk5hbWVbZ2RdPVVpbm5lYWcgw7lyCk5hbWVbZ2xdPU5vdmEgeGFuZWxhCk5hbWVbZ25dPU92ZXTDoyBweWFodQpOYW1lW2d1X0lOXT3gqqjgqrXgq4Ag4Kq14Kq/4Kqo4KuN4Kqh4KuLCk5hbWVbaGVdPdeX15zXldefINeX15PXqQpOYW1lW2hpX0lOXT3gpKjgpK/gpL4g4KS14KS/4KSC4KSh4KWLCk5hbWVbaHJdPU5vdmkgcHJvem9yCk5hbWVbaHNiXT1Ob3dlIHdva25vCk5hbWVbaHVdPcOaaiBhYmxhawpOYW1lW2h5X0FNXT3VhtW41oAg1YrVodW/1bjWgtWw1aHVtgpOYW1lW2lkXT1KZW5kZWxhIEJhcnUKTmFtZVtpc109TsO9ciBnbHVnZ2kKTmFtZVtpdF09TnVvdmEgZmluZXN0cmEKTmFtZVtqYV095paw44GX44GE44Km44Kj44Oz44OJ44KmCk5hbWVbamFfSlAtbWFjXT3mlrDopo/jgqbjgqTjg7Pjg4njgqYKTmFtZVtrYV094YOQ4YOu4YOQ4YOa4YOYIOGDpOGDkOGDnOGDr+GDkOGDoOGDkApOYW1lW2trXT3QltCw0qPQsCDRgtC10YDQtdC30LUKTmFtZVtrbV094Z6U4Z6E4Z+S4Z6i4Z694Z6F4Z6Q4Z+S4Z6Y4Z64Ck5hbWVba25dPeCyueCziuCyuCDgspXgsr/gsp/gspXgsr8KTmFtZVtrb1097IOIIOywvQpOYW1lW2tva1094KSo4KS14KWH4KSCIOCknOCkqOClh+CksgpOYW1lW2tzXT3Zhtim2KYg2YjZkNmG2ojZiApOYW1lW2xpal09TmV1dm8gYmFyY29uCk5hbWVbbG9dPeC6q+C6meC7ieC6suC6leC7iOC6suC6h+C7g+C6q+C6oeC7iApOYW1lW2x0XT1OYXVqYXMgbGFuZ2FzCk5hbWVbbHRnXT1KYXVucyBsxatncwpOYW1lW2x2XT1KYXVucyBsb2dzCk5hbWVbbWFpXT3gpKjgpLUg4KS14KS/4KSC4KSh4KWLCk5hbWVbbWtdPdCd0L7QsiDQv9GA0L7Qt9C+0YDQtdGGCk5hbWVbbWxdPeC0quC1geC0pOC0v+C0ryDgtJzgtL7gtLLgtJXgtIIKTmFtZVttcl094KSo4KS14KWA4KSoIOCkquCkn+CksgpOYW1lW21zXT1UZXRpbmdrYXAgQmFydQpOYW1lW215XT3hgJ3hgIThgLrhgLjhgJLhgK3hgK/hgLjhgKHhgJ7hgIXhgLoKTmFtZVtuYl9OT109Tnl0dCB2aW5kdQpOYW1lW25lX05QXT3gpKjgpK/gpL7gpIEg4KS44KSe4KWN4KSd4KWN4KSv4KS+4KSyCk5hbWVbbmxdPU5pZXV3IHZlbnN0ZXIKTmFtZVtubl9OT109Tnl0dCB2aW5kYXVnZQpOYW1lW29yXT3grKjgrYLgrKTgrKgg4K2x4Ky/4Kyj4K2N4Kyh4K2LCk5hbWVbcGFfSU5dPeCoqOCoteCpgOCogiDgqLXgqL/gqbDgqKHgqYsKTmFtZVtwbF09Tm93ZSBva25vCk5hbWVbcHRfQlJdPU5vdmEgamFuZWxhCk5hbWVbcHRfUFRdPU5vdmEgamFuZWxhCk5hbWVbcm1dPU5vdmEgZmFuZXN0cmEKTmFtZVtyb109RmVyZWFzdHLEgyBub3XEgwpOYW1lW3J1XT3QndC+0LLQvtC1INC+0LrQvdC+Ck5hbWVbc2F0XT3gpKjgpL7gpLXgpL4g4KS14KS/4KSC4KSh4KWLIChOKQpOYW1lW3NpXT3gtrHgt4Ag4Laa4LeA4LeU4LeF4LeU4LeA4Laa4LeKCk5hbWVbc2tdPU5vdsOpIG9rbm8KTmFtZVtzbF09Tm92byBva25vCk5hbWVbc29uXT1aYW5mdW4gdGFhZ2EKTmFtZVtzcV09RHJpdGFyZSBlIFJlCk5hbWVbc3JdPdCd0L7QstC4INC/0YDQvtC30L7RgApOYW1lW3N2X1NFXT1OeXR0IGbDtm5zdGVyCk5hbWVbdGFdPeCuquCvgeCupOCuv+CuryDgrprgrr7grrPgrrDgrq7gr40KTmFtZVt0ZV094LCV4LGK4LCk4LGN4LCkIOCwteCwv+CwguCwoeCxiwpOYW1lW3RoXT3guKvguJnguYnguLLguJXguYjguLLguIfguYPguKvguKHguYgKTmFtZVt0cl09WWVuaSBwZW5jZXJlCk5hbWVbdHN6XT1FcmFhdGFyYWt1YSBqaW1wYW5pCk5hbWVbdWtdPdCd0L7QstC1INCy0ZbQutC90L4KTmFtZVt1cl092YbbjNinINiv2LHbjNqG24EKTmFtZVt1el09WWFuZ2kgb3luYQpOYW1lW3ZpXT1D4butYSBz4buVIG3hu5tpCk5hbWVbd29dPVBhbGFudGVlciBidSBiZWVzCk5hbWVbeGhdPUlmZXN0aWxlIGVudHNoYQpOYW1lW3poX0NOXT3mlrDlu7rnqpflj6MKTmFtZVt6aF9UV1096ZaL5paw6KaW56qXCkV4ZWM9JSUlRVhUUkFDVF9ESVIlJSUvZmlyZWZveCAtLW5ldy13aW5kb3cgJXUKCltEZXNrdG9wIEFjdGlvbiBuZXctcHJpdmF0ZS13aW5kb3ddCk5hbWU9TmV3IFByaXZhdGUgV2luZG93Ck5hbWVbYWNoXT1EaXJpY2EgbWFueWVuIG1lIG11bmcKTmFtZVthZl09TnV3ZSBwcml2YWF0dmVuc3RlcgpOYW1lW2FuXT1OdWV2YSBmaW5lc3RyYSBwcml2YWRhCk5hbWVbYXJdPdmG2KfZgdiw2Kkg2K7Yp9i12Kkg2KzYr9mK2K/YqQpOYW1lW2FzXT3gpqjgpqTgp4Hgpqgg4Kas4KeN4Kav4KaV4KeN4Kak4Ka/4KaX4KakIOCmieCmh+CmqOCnjeCmoeCniwpOYW1lW2FzdF09VmVudGFuYSBwcml2YWRhIG51ZXZhCk5hbWVbYXpdPVllbmkgTcmZeGZpIFDJmW5jyZlyyZkKTmFtZVtiZV090J3QvtCy0LDQtSDQsNC60L3QviDQsNC00LDRgdCw0LHQu9C10L3QvdGPCk5hbWVbYmddPdCd0L7QsiDQv9GA0L7Qt9C+0YDQtdGGINC30LAg0L/QvtCy0LXRgNC40YLQtdC70L3QviDRgdGK0YDRhNC40YDQsNC90LUKTmFtZVtibl9CRF094Kao4Kak4KeB4KaoIOCmrOCnjeCmr+CmleCnjeCmpOCmv+Cml+CmpCDgpongpofgpqjgp43gpqHgp4sKTmFtZVtibl9JTl094Kao4Kak4KeB4KaoIOCmrOCnjeCmr+CmleCnjeCmpOCmv+Cml+CmpCDgpongpofgpqjgp43gpqHgp4sKTmFtZVticl09UHJlbmVzdHIgbWVyZGVpw7EgcHJldmV6IG5ldmV6Ck5hbWVbYnJ4XT3gpJfgpYvgpKbgpL7gpKgg4KSq4KWN4KSw4KS+4KSH4KSt4KWH4KSfIOCkieCkh+CkqOCljeCkoScKTmFtZVtic109Tm92aSBwcml2YXRuaSBwcm96b3IKTmFtZVtjYV09RmluZXN0cmEgcHJpdmFkYSBub3ZhCk5hbWVbY2FrXT1LJ2FrJ2EnIGljaGluYW4gdHp1d8OkY2gKTmFtZVtjc109Tm92w6kgYW5vbnltbsOtIG9rbm8KTmFtZVtjeV09RmZlbmVzdHIgQnJlaWZhdCBOZXd5ZGQKTmFtZVtkYV09Tnl0IHByaXZhdCB2aW5kdWUKTmFtZVtkZV09TmV1ZXMgcHJpdmF0ZXMgRmVuc3RlcgpOYW1lW2RzYl09Tm93ZSBwcml3YXRuZSB3b2tubwpOYW1lW2VsXT3Onc6tzr8gz4DOsc+BzqzOuM+Fz4HOvyDOuc60zrnPic+EzrnOus6uz4Igz4DOtc+BzrnOrs6zzrfPg863z4IKTmFtZVtlbl9HQl09TmV3IFByaXZhdGUgV2luZG93Ck5hbWVbZW5fVVNdPU5ldyBQcml2YXRlIFdpbmRvdwpOYW1lW2VuX1pBXT1OZXcgUHJpdmF0ZSBXaW5kb3cKTmFtZVtlb109Tm92YSBwcml2YXRhIGZlbmVzdHJvCk5hbWVbZXNfQVJdPU51ZXZhIHZlbnRhbmEgcHJpdmFkYQpOYW1lW2VzX0NMXT1OdWV2YSB2ZW50YW5hIHByaXZhZGEKTmFtZVtlc19FU109TnVldmEgdmVudGFuYSBwcml2YWRhCk5hbWVbZXNfTVhdPU51ZXZhIHZlbnRhbmEgcHJpdmFkYQpOYW1lW2V0XT1VdXMgcHJpdmFhdG5lIGFrZW4KTmFtZVtldV09TGVpaG8gcHJpYmF0dSBiZXJyaWEKTmFtZVtmYV092b7Zhtis2LHZhyDZhtin2LTZhtin2LMg2KzYr9uM2K8KTmFtZVtmZl09SGVub3JkZSBTdXR1cm8gSGVzZXJlCk5hbWVbZmldPVV1c2kgeWtzaXR5aW5lbiBpa2t1bmEKTmFtZVtmcl09Tm91dmVsbGUgZmVuw6p0cmUgZGUgbmF2aWdhdGlvbiBwcml2w6llCk5hbWVbZnlfTkxdPU5paiBwcml2ZWVmaW5zdGVyCk5hbWVbZ2FfSUVdPUZ1aW5uZW9nIE51YSBQaHLDrW9iaMOhaWRlYWNoCk5hbWVbZ2RdPVVpbm5lYWcgcGhyw6xvYmhhaWRlYWNoIMO5cgpOYW1lW2dsXT1Ob3ZhIHhhbmVsYSBwcml2YWRhCk5hbWVbZ25dPU92ZXTDoyDDsWVtaSBweWFodQpOYW1lW2d1X0lOXT3gqqjgqrXgq4Ag4KqW4Kq+4Kqo4KqX4KuAIOCqteCqv+CqqOCrjeCqoeCriwpOYW1lW2hlXT3Xl9ec15XXnyDXpNeo15jXmSDXl9eT16kKTmFtZVtoaV9JTl094KSo4KSv4KWAIOCkqOCkv+CknOClgCDgpLXgpL/gpILgpKHgpYsKTmFtZVtocl09Tm92aSBwcml2YXRuaSBwcm96b3IKTmFtZVtoc2JdPU5vd2UgcHJpd2F0bmUgd29rbm8KTmFtZVtodV09w5pqIHByaXbDoXQgYWJsYWsKTmFtZVtoeV9BTV091Y3Vr9W91aXVrCDUs9Wh1bLVv9W21asg1aTVq9W/1aHWgNWv1bjWgtW0Ck5hbWVbaWRdPUplbmRlbGEgTW9kZSBQcmliYWRpIEJhcnUKTmFtZVtpc109TsO9ciBodWxpw7BzZ2x1Z2dpCk5hbWVbaXRdPU51b3ZhIGZpbmVzdHJhIGFub25pbWEKTmFtZVtqYV095paw44GX44GE44OX44Op44Kk44OZ44O844OI44Km44Kj44Oz44OJ44KmCk5hbWVbamFfSlAtbWFjXT3mlrDopo/jg5fjg6njgqTjg5njg7zjg4jjgqbjgqTjg7Pjg4njgqYKTmFtZVtrYV094YOQ4YOu4YOQ4YOa4YOYIOGDnuGDmOGDoOGDkOGDk+GDmCDhg6Thg5Dhg5zhg6/hg5Dhg6Dhg5AKTmFtZVtra1090JbQsNKj0LAg0LbQtdC60LXQu9GW0Log0YLQtdGA0LXQt9C1Ck5hbWVba21dPeGelOGehOGfkuGeouGeveGeheGer+GegOGeh+Gek+GekOGfkuGemOGeuApOYW1lW2tuXT3gsrngs4rgsrgg4LKW4LK+4LK44LKX4LK/IOCyleCyv+Cyn+CyleCyvwpOYW1lW2tvXT3sg4gg7IKs7IOd7ZmcIOuztO2YuCDrqqjrk5wKTmFtZVtrb2tdPeCkqOCkteCliyDgpJbgpL7gpJzgpJfgpYAg4KS14KS/4KSC4KSh4KWLCk5hbWVba3NdPdmG2ZLZiCDZvtix2KfbjNmI2bkg2YjbjNmG2ojZiApOYW1lW2xpal09TsOqdXZvIGJhcmPDs24gcHJpdsOydQpOYW1lW2xvXT3gu4DgupvgurXgupTguqvgupngu4ngurLgupXgu4jgurLguofguqrguqfgupngupXgurvguqfguoLgurfgu4ngupnguqHgurLgu4PguqvguqHgu4gKTmFtZVtsdF09TmF1amFzIHByaXZhdGF1cyBuYXLFoXltbyBsYW5nYXMKTmFtZVtsdGddPUphdW5zIHByaXZhdGFpcyBsxatncwpOYW1lW2x2XT1KYXVucyBwcml2xIF0YWlzIGxvZ3MKTmFtZVttYWldPeCkqOCkr+CkviDgpKjgpL/gpJwg4KS14KS/4KSC4KSh4KWLIChXKQpOYW1lW21rXT3QndC+0LIg0L/RgNC40LLQsNGC0LXQvSDQv9GA0L7Qt9C+0YDQtdGGCk5hbWVbbWxdPeC0quC1geC0pOC0v+C0ryDgtLjgtY3gtLXgtJXgtL7gtLDgtY3gtK8g4LSc4LS+4LSy4LSV4LSCCk5hbWVbbXJdPeCkqOCkteClgOCkqCDgpLXgpYjgpK/gpJXgpY3gpKTgpL/gpJUg4KSq4KSf4KSyCk5hbWVbbXNdPVRldGluZ2thcCBQZXJzZW5kaXJpYW4gQmFoYXJ1Ck5hbWVbbXldPU5ldyBQcml2YXRlIFdpbmRvdwpOYW1lW25iX05PXT1OeXR0IHByaXZhdCB2aW5kdQpOYW1lW25lX05QXT3gpKjgpK/gpL7gpIEg4KSo4KS/4KSc4KWAIOCkuOCknuCljeCkneCljeCkr+CkvuCksgpOYW1lW25sXT1OaWV1dyBwcml2w6l2ZW5zdGVyCk5hbWVbbm5fTk9dPU55dHQgcHJpdmF0IHZpbmRhdWdlCk5hbWVbb3JdPeCsqOCtguCspOCsqCDgrKzgrY3grZ/grJXgrY3grKTgrL/grJfgrKQg4K2x4Ky/4Kyj4K2N4Kyh4K2LCk5hbWVbcGFfSU5dPeCoqOCoteCpgOCogiDgqKrgqY3gqLDgqL7gqIjgqLXgqYfgqJ8g4Ki14Ki/4Kmw4Kih4KmLCk5hbWVbcGxdPU5vd2Ugb2tubyBwcnl3YXRuZQpOYW1lW3B0X0JSXT1Ob3ZhIGphbmVsYSBwcml2YXRpdmEKTmFtZVtwdF9QVF09Tm92YSBqYW5lbGEgcHJpdmFkYQpOYW1lW3JtXT1Ob3ZhIGZhbmVzdHJhIHByaXZhdGEKTmFtZVtyb109RmVyZWFzdHLEgyBwcml2YXTEgyBub3XEgwpOYW1lW3J1XT3QndC+0LLQvtC1INC/0YDQuNCy0LDRgtC90L7QtSDQvtC60L3QvgpOYW1lW3NhdF094KSo4KS+4KS14KS+IOCkqOCkv+CknOClh+CksOCkvuCkleCljSDgpLXgpL/gpILgpKHgpYsgKFcgKQpOYW1lW3NpXT3gtrHgt4Ag4La04LeU4Lav4LeK4Lac4La94LeS4LaaIOC2muC3gOC3lOC3heC3lOC3gCAoVykKTmFtZVtza109Tm92w6kgb2tubyB2IHJlxb5pbWUgU8O6a3JvbW7DqSBwcmVobGlhZGFuaWUKTmFtZVtzbF09Tm92byB6YXNlYm5vIG9rbm8KTmFtZVtzb25dPVN1dHVyYSB6YW5mdW4gdGFhZ2EKTmFtZVtzcV09RHJpdGFyZSBlIFJlIFByaXZhdGUKTmFtZVtzcl090J3QvtCy0Lgg0L/RgNC40LLQsNGC0LDQvSDQv9GA0L7Qt9C+0YAKTmFtZVtzdl9TRV09Tnl0dCBwcml2YXQgZsO2bnN0ZXIKTmFtZVt0YV094K6q4K+B4K6k4K6/4K6vIOCupOCuqeCuv+CuquCvjeCuquCun+CvjeCunyDgrprgrr7grrPgrrDgrq7gr40KTmFtZVt0ZV094LCV4LGK4LCk4LGN4LCkIOCwhuCwguCwpOCwsOCwguCwl+Cwv+CwlSDgsLXgsL/gsILgsKHgsYsKTmFtZVt0aF094Lir4LiZ4LmJ4Liy4LiV4LmI4Liy4LiH4Liq4LmI4Lin4LiZ4LiV4Lix4Lin4LmD4Lir4Lih4LmICk5hbWVbdHJdPVllbmkgZ2l6bGkgcGVuY2VyZQpOYW1lW3Rzel09SnVjaGlpdGkgZXJhYXRhcmFrdWEgamltcGFuaQpOYW1lW3VrXT3Qn9GA0LjQstCw0YLQvdC1INCy0ZbQutC90L4KTmFtZVt1cl092YbbjNinINmG2KzbjCDYr9ix24zahtuBCk5hbWVbdXpdPVlhbmdpIG1heGZpeSBveW5hCk5hbWVbdmldPUPhu61hIHPhu5UgcmnDqm5nIHTGsCBt4bubaQpOYW1lW3dvXT1QYW5sYW50ZWVydSBiaWlyIGJ1IGJlZXMKTmFtZVt4aF09SWZlc3RpbGUgeWFuZ2FzZXNlIGVudHNoYQpOYW1lW3poX0NOXT3mlrDlu7rpmpDnp4HmtY/op4jnqpflj6MKTmFtZVt6aF9UV1095paw5aKe6Zqx56eB6KaW56qXCkV4ZWM9JSUlRVhUUkFDVF9ESVIlJSUvZmlyZWZveCAtLXByaXZhdGUtd2luZG93ICV1CgpbRGVza3RvcCBBY3Rpb24gcHJvZmlsZS1tYW5hZ2VyLXdpbmRvd10KTmFtZT1PcGVuIHRoZSBQcm9maWxlIE1hbmFnZXIKTmFtZVtjc109U3Byw6F2YSBwcm9maWzFrwpFeGVjPSUlJUVYVFJBQ1RfRElSJSUlL2ZpcmVmb3ggLS1Qcm9maWxlTWFuYWdlcgo="  # noqa
+) -> bool:
+    """Write the desktop entry of an install, returning whether it changed."""
+    makedirs(get_applications_dir(), exist_ok=True)
+    desktop_file = get_desktop_file(product_select, platform_select, language_select)
+    changed = write_if_changed(
+        desktop_file, render_desktop_entry(product_select, extract_dir)
     )
-    desktop_data = desktop_data.replace(
-        b"%%%RELEASE_TYPE%%%", product_select.encode("utf-8")
+    record_desktop_file(
+        extract_dir, (product_select, platform_select, language_select), desktop_file
     )
-    desktop_data = desktop_data.replace(
-        b"%%%EXTRACT_DIR%%%", extract_dir.encode("utf-8")
+    return changed
+
+
+def sync_desktop_entries() -> Tuple[int, int, int]:
+    """Bring the desktop entries of all recorded installs up to date.
+
+    Entries are rendered for every install still on disk and written where
+    they differ, and entries whose install directory is gone are removed.
+
+    Returns the number of entries written, left unchanged and removed.
+    """
+    written = unchanged = removed = 0
+    wanted = set()
+    makedirs(get_applications_dir(), exist_ok=True)
+    for install_record in get_installs():
+        spec = (
+            install_record["product"],
+            install_record["platform"],
+            install_record["language"],
+        )
+        if None in spec or not isdir(install_record["extract_dir"]):
+            continue
+        desktop_file = get_desktop_file(*spec)
+        wanted.add(desktop_file)
+        if write_if_changed(
+            desktop_file,
+            render_desktop_entry(spec[0], install_record["extract_dir"]),
+        ):
+            written += 1
+        else:
+            unchanged += 1
+        if install_record["desktop_file"] != desktop_file:
+            record_desktop_file(install_record["extract_dir"], spec, desktop_file)
+
+    for name in listdir(get_applications_dir()):
+        path = path_join(get_applications_dir(), name)
+        if (
+            name.startswith(DESKTOP_FILE_PREFIX)
+            and name.endswith(".desktop")
+            and path not in wanted
+        ):
+            # Installs without a full record, such as those made before the
+            # state database, keep their entries for as long as they exist.
+            extract_dir = get_desktop_entry_dir(path)
+            if extract_dir is None or isdir(extract_dir):
+                continue
+            remove(path)
+            removed += 1
+    return written, unchanged, removed
+
+
+def get_desktop_entry_dir(desktop_file: str) -> Optional[str]:
+    """Return the install directory that a desktop entry launches Firefox from."""
+    try:
+        with open(desktop_file, "r", encoding="utf-8") as fp:
+            for line in fp:
+                match = re.match(r"Exec=(.+)/firefox(?: |$)", line)
+                if match:
+                    return match.group(1)
+    except (OSError, UnicodeDecodeError):
+        pass
+    return None
+
+
+FICLONE = 0x40049409
+
+
+def get_install_dirs() -> List[str]:
+    try:
+        names = sorted(listdir(get_install_root()))
+    except FileNotFoundError:
+        return []
+    return [
+        path_join(get_install_root(), name)
+        for name in names
+        if name.startswith("firefox_") and isdir(path_join(get_install_root(), name))
+    ]
+
+
+def file_digest(path: str, name: str = "sha256") -> str:
+    digest = hashlib.new(name)
+    with open(path, "rb") as fp:
+        while True:
+            chunk = fp.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def reflink_file(src: str, dst: str) -> bool:
+    temp_dst = f"{dst}.rany2-dedup"
+    try:
+        with open(src, "rb") as src_fp, open(temp_dst, "wb") as dst_fp:
+            fcntl.ioctl(dst_fp.fileno(), FICLONE, src_fp.fileno())
+    except OSError:
+        if isfile(temp_dst):
+            remove(temp_dst)
+        return False
+    shutil.copystat(dst, temp_dst)
+    replace(temp_dst, dst)
+    return True
+
+
+def hardlink_file(src: str, dst: str) -> None:
+    temp_dst = f"{dst}.rany2-dedup"
+    link(src, temp_dst)
+    replace(temp_dst, dst)
+
+
+def dedup_installs(
+    install_dirs: Optional[List[str]] = None, use_reflink: bool = False
+) -> Tuple[int, int]:
+    """Replace identical regular files across installs with hardlinks.
+
+    With use_reflink, copy-on-write clones are tried first and hardlinks are
+    only used where the filesystem can not clone. File hashes are kept in an
+    index keyed by inode, size and mtime, so repeat runs only hash new files.
+
+    Returns the number of files deduplicated and the bytes saved.
+    """
+    if install_dirs is None:
+        install_dirs = get_install_dirs()
+    index_path = path_join(get_install_root(), ".dedup_index.json")
+    try:
+        with open(index_path, "r", encoding="utf-8") as fp:
+            index = json.load(fp)
+    except (OSError, ValueError):
+        index = {}
+
+    new_index = {}
+    groups = {}
+    for install_dir in install_dirs:
+        for root, _, files in walk(install_dir):
+            for name in files:
+                path = path_join(root, name)
+                st = lstat(path)
+                if not S_ISREG(st.st_mode) or st.st_size == 0:
+                    continue
+                key = [st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns]
+                cached = index.get(path)
+                if cached is not None and cached[:4] == key:
+                    new_index[path] = cached
+                else:
+                    new_index[path] = key + [file_digest(path), None]
+                group_key = (st.st_dev, st.st_size, new_index[path][4])
+                groups.setdefault(group_key, []).append((path, S_IMODE(st.st_mode)))
+
+    files_deduped = 0
+    bytes_saved = 0
+    for (_, size, _), paths in groups.items():
+        keep, keep_mode = paths[0]
+        keep_ino = new_index[keep][1]
+        for path, mode in paths[1:]:
+            entry = new_index[path]
+            # Hardlinks share permissions, so only files that agree on them.
+            if mode != keep_mode or entry[1] == keep_ino or entry[5] == keep:
+                continue
+            if use_reflink and reflink_file(keep, path):
+                shared_with = keep
+            else:
+                hardlink_file(keep, path)
+                shared_with = None
+            st = lstat(path)
+            new_index[path] = [
+                st.st_dev,
+                st.st_ino,
+                st.st_size,
+                st.st_mtime_ns,
+                entry[4],
+                shared_with,
+            ]
+            files_deduped += 1
+            bytes_saved += size
+
+    makedirs(dirname(index_path), exist_ok=True)
+    with open(f"{index_path}.tmp", "w", encoding="utf-8") as fp:
+        json.dump(new_index, fp)
+    replace(f"{index_path}.tmp", index_path)
+    return files_deduped, bytes_saved
+
+
+def run_dedup(use_reflink: bool) -> None:
+    print()
+    print("Deduplicating installed files...")
+    files_deduped, bytes_saved = dedup_installs(use_reflink=use_reflink)
+    print(
+        f"Deduplicated {files_deduped} files, "
+        f"saving {bytes_saved / (1024 * 1024):.1f} MiB."
     )
-    desktop_data = desktop_data.replace(b"%%%WM_CLASS%%%", wm_class.encode("utf-8"))
-    applications_dir = path_join(get_xdg_data_home(), "applications")
-    makedirs(applications_dir, exist_ok=True)
-    # noinspection SpellCheckingInspection
-    with open(
-        expanduser(
-            f"{applications_dir}/rany2_firefox_installer-firefox_{_release_type}_{platform_select}_{language_select}.desktop"  # noqa
-        ),
-        "w+b",
-    ) as fp:
-        fp.write(desktop_data)
 
 
-def main() -> None:
-    doc = parsed_download_page()
+def print_installs(
+    as_json: bool, name: Optional[str] = None, details: bool = False
+) -> None:
+    extract_dir = None
+    if name is not None:
+        extract_dir = name if isabs(name) else path_join(get_install_root(), name)
+    installs = get_installs(extract_dir)
+    if as_json:
+        print(json.dumps(installs, indent=2))
+        return
+    if not installs:
+        print("No installations recorded.")
+        return
+    for install_record in installs:
+        installed_at = install_record["installed_at"]
+        print(
+            f"{basename(install_record['extract_dir'])}: "
+            f"{install_record['version'] or 'unknown version'}, installed "
+            + (
+                time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(installed_at))
+                if installed_at
+                else "at an unknown time"
+            )
+        )
+        if details:
+            print(f"  Directory: {install_record['extract_dir']}")
+            print(f"  Product: {install_record['product']}")
+            print(f"  Platform: {install_record['platform']}")
+            print(f"  Language: {install_record['language']}")
+            print(f"  Download: {install_record['url']}")
+            print(f"  SHA-512: {install_record['sha512']}")
+            print(
+                f"  Files: {install_record['file_count']}, "
+                f"{install_record['total_size'] / (1024 * 1024):.1f} MiB"
+            )
+            print(f"  Desktop file: {install_record['desktop_file']}")
+            for snapshot in get_snapshots(install_record["extract_dir"]):
+                print(
+                    f"  Snapshot {basename(snapshot['snapshot_dir'])}: "
+                    f"{snapshot['version'] or 'unknown version'}"
+                )
 
-    product_select = get_product_selection(doc)
-    platform_select = get_platform_selection(doc, product_select)
-    language_select = get_language_selection(doc, product_select)
-    current_href = get_current_href(
-        doc, product_select, language_select, platform_select
+
+def resolve_redirect(url: str) -> str:
+    """Return where url redirects to, using one HEAD request that is not followed."""
+    cached = SESSION.get_cached_redirect(url)
+    if cached != url:
+        return cached
+    with SESSION.open(url, "HEAD", follow_redirects=False) as resp:
+        if resp.status in REDIRECT_STATUSES and resp.headers.get("Location"):
+            return urljoin(url, resp.headers["Location"])
+        return resp.geturl()
+
+
+def resolve_download_url(url: str, max_redirects: int = 5) -> str:
+    """Follow redirects, without downloading, until the URL names a build."""
+    for _ in range(max_redirects):
+        if get_version_from_url(url) is not None:
+            break
+        url = resolve_redirect(url)
+    return url
+
+
+def read_application_version(extract_dir: str, key: str = "Version") -> Optional[str]:
+    """Read Version, or another key such as BuildID, from application.ini."""
+    try:
+        with open(
+            path_join(extract_dir, "application.ini"), "r", encoding="utf-8"
+        ) as fp:
+            for line in fp:
+                if line.startswith(f"{key}="):
+                    return line.split("=", 1)[1].strip()
+    except OSError:
+        pass
+    return None
+
+
+def get_build_id(url: str) -> Optional[str]:
+    """Fetch the build ID that nightlies publish next to the tarball.
+
+    Every nightly of a cycle has the same version, and the latest-* links
+    keep their path too, so only the build ID tells two of them apart.
+    """
+    parts = urlsplit(url)
+    match = re.fullmatch(r"(.*/firefox-[^/]+)\.tar\.[a-z0-9]+", parts.path)
+    if match is None or "/releases/" in parts.path:
+        return None
+    # firefox-133.0a1.en-US.linux-x86_64.txt holds the build ID and revision.
+    txt_url = urlunsplit((parts.scheme, parts.netloc, f"{match.group(1)}.txt", "", ""))
+    try:
+        with SESSION.open(txt_url) as resp:
+            lines = resp.read().decode("utf-8", "replace").split()
+    except HTTPError as e:
+        if e.code == 404:
+            return None
+        raise
+    return lines[0] if lines and lines[0].isdigit() else None
+
+
+def guess_spec(index: Dict[str, Any], name: str) -> Optional["Spec"]:
+    # firefox_<channel>-<platform>-<language>, see get_extract_dir().
+    if not name.startswith("firefox_"):
+        return None
+    channel, _, rest = name[len("firefox_") :].partition("-")
+    product = f"desktop_{channel}"
+    for platform in index["platforms"].get(product, []):
+        if rest.startswith(f"{platform}-"):
+            return product, platform, rest[len(platform) + 1 :]
+    return None
+
+
+def check_updates(index: Dict[str, Any], jobs: int = 8) -> List[Dict[str, Any]]:
+    """Compare every managed install with the build that is offered now.
+
+    Only the download redirects are requested, on a pool of jobs connections.
+    A build of the installed version still counts as an update when its URL
+    differs from the recorded one, or, for nightlies, when its build ID does.
+    """
+    records = {record["extract_dir"]: record for record in get_installs()}
+    entries = []
+    for extract_dir in get_install_dirs():
+        record = records.get(extract_dir, {})
+        spec = (record.get("product"), record.get("platform"), record.get("language"))
+        if None in spec:
+            spec = guess_spec(index, basename(extract_dir))
+        installed = record.get("version") or read_application_version(extract_dir)
+        entries.append((extract_dir, spec, installed, record.get("url")))
+
+    def check(
+        entry: Tuple[str, Optional[Spec], Optional[str], Optional[str]],
+    ) -> Dict[str, Any]:
+        extract_dir, spec, installed, installed_url = entry
+        report = {
+            "install": basename(extract_dir),
+            "extract_dir": extract_dir,
+            "product": spec[0] if spec else None,
+            "platform": spec[1] if spec else None,
+            "language": spec[2] if spec else None,
+            "installed_version": installed,
+            "available_version": None,
+            "installed_build_id": None,
+            "available_build_id": None,
+            "update_available": None,
+            "error": None,
+        }
+        try:
+            if spec is None:
+                raise ValueError("Can not tell which build this installation is")
+            url = get_current_href(index, spec[0], spec[2], spec[1])
+            if url is None:
+                raise ValueError("This build is no longer on the download page")
+            available_url = resolve_download_url(url)
+            available = get_version_from_url(available_url)
+            report["available_version"] = available
+            if available is None:
+                return report
+            if available != installed:
+                report["update_available"] = True
+            elif (
+                installed_url is not None
+                and urlsplit(installed_url).path != urlsplit(available_url).path
+            ):
+                # A nightly from another dated build directory, or a re-spin.
+                report["update_available"] = True
+            else:
+                installed_id = read_application_version(extract_dir, "BuildID")
+                available_id = get_build_id(available_url)
+                report["installed_build_id"] = installed_id
+                report["available_build_id"] = available_id
+                report["update_available"] = (
+                    installed_id is not None
+                    and available_id is not None
+                    and installed_id != available_id
+                )
+        except Exception as e:
+            report["error"] = f"{type(e).__name__}: {e}"
+        return report
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        return list(executor.map(check, entries))
+
+
+WARM_UP_MIN_SIZE = 1024 * 1024
+WARM_UP_LAUNCH_TIMEOUT = 120.0
+
+
+def prefetch_install(
+    extract_dir: str, min_size: int = WARM_UP_MIN_SIZE
+) -> Tuple[int, int]:
+    """Ask the kernel to read the large files of an install into the page cache.
+
+    The files are taken from the recorded manifest, largest first, so that
+    libxul.so and omni.ja are queued before anything else. Returns the number
+    of files and bytes prefetched.
+    """
+    manifest = load_manifest(extract_dir)
+    if manifest is not None:
+        files = [
+            (size, path_join(extract_dir, name)) for name, (size, _) in manifest.items()
+        ]
+    else:
+        files = []
+        for root, _, names in walk(extract_dir):
+            for name in names:
+                path = path_join(root, name)
+                st = lstat(path)
+                if S_ISREG(st.st_mode):
+                    files.append((st.st_size, path))
+    files.sort(reverse=True)
+
+    prefetched = nbytes = 0
+    for size, path in files:
+        if size < min_size:
+            break
+        try:
+            with open(path, "rb") as fp:
+                # WILLNEED starts the readahead and returns without waiting.
+                posix_fadvise(fp.fileno(), 0, 0, POSIX_FADV_WILLNEED)
+        except OSError:
+            continue
+        prefetched += 1
+        nbytes += size
+    return prefetched, nbytes
+
+
+def time_headless_start(
+    extract_dir: str, profile_dir: str, timeout: float = WARM_UP_LAUNCH_TIMEOUT
+) -> float:
+    """Start Firefox headless on profile_dir until it exits, returning the time taken.
+
+    Taking a screenshot of about:blank makes Firefox quit once it has started up.
+    """
+    env = dict(environ, MOZ_CRASHREPORTER_DISABLE="1")
+    start = time.perf_counter()
+    subprocess.run(
+        [
+            path_join(extract_dir, "firefox"),
+            "--headless",
+            "--no-remote",
+            "--profile",
+            profile_dir,
+            "--screenshot",
+            path_join(profile_dir, "warm-up.png"),
+            "about:blank",
+        ],
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        env=env,
+        timeout=timeout,
+        check=True,
+    )
+    return time.perf_counter() - start
+
+
+def warm_up_install(
+    extract_dir: str, launch: bool = False, timeout: float = WARM_UP_LAUNCH_TIMEOUT
+) -> Dict[str, Any]:
+    """Prefetch an install and optionally start it once so the first real start is fast.
+
+    With launch, Firefox is started headless twice on a throwaway profile; the
+    first start is reported as cold and the second as warm.
+    """
+    report = {
+        "install": basename(extract_dir),
+        "prefetched_files": 0,
+        "prefetched_bytes": 0,
+        "prefetch_seconds": None,
+        "cold_start_seconds": None,
+        "warm_start_seconds": None,
+        "error": None,
+    }
+    with METRICS.phase("warm_up"):
+        start = time.perf_counter()
+        report["prefetched_files"], report["prefetched_bytes"] = prefetch_install(
+            extract_dir
+        )
+        report["prefetch_seconds"] = time.perf_counter() - start
+        if not launch:
+            return report
+        profile_dir = mkdtemp(prefix="firefox-warm-up-")
+        try:
+            report["cold_start_seconds"] = time_headless_start(
+                extract_dir, profile_dir, timeout
+            )
+            report["warm_start_seconds"] = time_headless_start(
+                extract_dir, profile_dir, timeout
+            )
+        except (OSError, subprocess.SubprocessError) as e:
+            report["error"] = f"{type(e).__name__}: {e}"
+        finally:
+            shutil.rmtree(profile_dir, ignore_errors=True)
+    return report
+
+
+def print_warm_up(report: Dict[str, Any]) -> None:
+    print(
+        f"Prefetched {report['prefetched_files']} files, "
+        f"{report['prefetched_bytes'] / (1024 * 1024):.1f} MiB, "
+        f"in {report['prefetch_seconds'] * 1000:.0f} ms."
     )
+    if report["cold_start_seconds"] is not None:
+        print(f"Cold start: {report['cold_start_seconds']:.2f} s")
+    if report["warm_start_seconds"] is not None:
+        print(f"Warm start: {report['warm_start_seconds']:.2f} s")
+    if report["error"] is not None:
+        print(f"Headless start failed: {report['error']}")
+
+
+Spec = Tuple[str, str, str]
+
+
+def get_extract_dir(
+    product_select: str, platform_select: str, language_select: str
+) -> str:
     # noinspection SpellCheckingInspection
-    extract_dir = path_join(
-        get_xdg_data_home(),
-        "rany2_firefox_installer",
+    return path_join(
+        get_install_root(),
         f"firefox_{product_select[len('desktop_'):]}-{platform_select}-{language_select}",
     )
+
+
+def install(
+    index: Dict[str, Any],
+    product_select: str,
+    platform_select: str,
+    language_select: str,
+    connections: int = 1,
+    use_cache: bool = True,
+    cache_max_bytes: int = ARTIFACT_CACHE_MAX_BYTES,
+    extract_workers: int = EXTRACT_WORKERS,
+    incremental: bool = False,
+    verify: bool = True,
+    keep_snapshots: int = SNAPSHOT_KEEP,
+    warm_up: bool = False,
+    warm_up_launch: bool = False,
+) -> None:
+    current_href = get_current_href(
+        index, product_select, language_select, platform_select
+    )
+    if current_href is None:
+        raise ValueError(
+            f"No download found for {product_select} {platform_select} {language_select}"
+        )
+    extract_dir = get_extract_dir(product_select, platform_select, language_select)
     makedirs(dirname(extract_dir), exist_ok=True)
-    download_and_extract(current_href, extract_dir)
+    download_and_extract(
+        current_href,
+        extract_dir,
+        connections,
+        (product_select, platform_select, language_select),
+        use_cache,
+        cache_max_bytes,
+        extract_workers,
+        incremental,
+        verify,
+        keep_snapshots,
+    )
 
     print()
     print("Creating desktop file...")
-    create_desktop(product_select, platform_select, language_select, extract_dir)
-    print("Desktop file created.")
+    with METRICS.phase("desktop_file"):
+        changed = create_desktop(
+            product_select, platform_select, language_select, extract_dir
+        )
+    print("Desktop file created." if changed else "Desktop file is up to date.")
+
+    if warm_up or warm_up_launch:
+        print()
+        print("Warming up...")
+        print_warm_up(warm_up_install(extract_dir, warm_up_launch))
+
+
+def parse_spec(spec: str) -> Spec:
+    parts = spec.split(":")
+    if len(parts) != 3 or not all(parts):
+        raise ValueError(f"Invalid spec {spec!r}, expected PRODUCT:PLATFORM:LANGUAGE")
+    return parts[0], parts[1], parts[2]
+
+
+def read_spec_file(path: str) -> List[Spec]:
+    specs = []
+    with open(path, "r", encoding="utf-8") as fp:
+        for line in fp:
+            line = line.split("#", 1)[0].strip()
+            if line:
+                specs.append(parse_spec(line))
+    return specs
+
+
+def batch_install(
+    index: Dict[str, Any], specs: List[Spec], jobs: int = 2, **options: Any
+) -> List[Tuple[Spec, Optional[str]]]:
+    """Install every spec on a pool of jobs workers.
+
+    Returns each spec with None on success or the error message on failure.
+    """
+
+    def run(spec: Spec) -> Optional[str]:
+        try:
+            install(index, *spec, **options)
+        except Exception as e:
+            return f"{type(e).__name__}: {e}"
+        return None
+
+    specs = list(dict.fromkeys(specs))
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        return list(zip(specs, executor.map(run, specs)))
+
+
+MIRROR_PORT = 8080
+MIRROR_UPSTREAM = "https://archive.mozilla.org"
+
+
+def get_mirror_href(mirror: str, href: str) -> str:
+    return f"{mirror.rstrip('/')}/bouncer?{urlencode({'url': href})}"
+
+
+def get_mirror_index(mirror: str) -> Dict[str, Any]:
+    """Fetch the download page index from a mirror, pointing its links at it."""
+    with SESSION.open(f"{mirror.rstrip('/')}/index.json") as resp:
+        index = json.load(resp)
+    for platforms in index["hrefs"].values():
+        for languages in platforms.values():
+            for language, href in languages.items():
+                languages[language] = get_mirror_href(mirror, href)
+    return index
+
+
+class MirrorFetch:
+    """A single upstream download that clients can read while it is running."""
+
+    def __init__(self, url: Optional[str], path: str):
+        self.url = url
+        self.path = path
+        self.size: Optional[int] = None
+        self.done = 0
+        self.started = False
+        self.finished = False
+        self.error: Optional[Exception] = None
+        self._cond = threading.Condition()
+
+    @classmethod
+    def complete(cls, path: str) -> "MirrorFetch":
+        fetch = cls(None, path)
+        fetch.size = fetch.done = getsize(path)
+        fetch.started = fetch.finished = True
+        return fetch
+
+    def start(self, on_done: Any) -> None:
+        threading.Thread(target=self._run, args=(on_done,), daemon=True).start()
+
+    def _run(self, on_done: Any) -> None:
+        part = f"{self.path}.part"
+        try:
+            makedirs(dirname(self.path), exist_ok=True)
+            with SESSION.open(self.url) as resp, open(part, "wb") as fp:
+                with self._cond:
+                    length = resp.headers.get("Content-Length")
+                    self.size = int(length) if length else None
+                    self.started = True
+                    self._cond.notify_all()
+                while True:
+                    chunk = resp.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    fp.write(chunk)
+                    fp.flush()
+                    with self._cond:
+                        self.done += len(chunk)
+                        self._cond.notify_all()
+            if self.size is not None and self.done != self.size:
+                raise IOError(f"Connection closed early while fetching {self.url}")
+            replace(part, self.path)
+        except Exception as e:
+            with self._cond:
+                self.error = e
+            if isfile(part):
+                remove(part)
+        finally:
+            with self._cond:
+                self.finished = True
+                self._cond.notify_all()
+        on_done()
+
+    def wait_started(self) -> None:
+        with self._cond:
+            self._cond.wait_for(lambda: self.started or self.finished)
+            if not self.started:
+                raise self.error
+
+    def copy_to(self, out: Any, start: int, end: Optional[int]) -> None:
+        """Write bytes start to end (inclusive) to out, waiting for them to arrive."""
+        try:
+            fp = open(f"{self.path}.part", "rb")
+        except FileNotFoundError:
+            # Already complete and renamed into place.
+            fp = open(self.path, "rb")
+        with fp:
+            fp.seek(start)
+            pos = start
+            while end is None or pos <= end:
+                with self._cond:
+                    self._cond.wait_for(lambda: self.done > pos or self.finished)
+                    available = self.done
+                    if available <= pos:
+                        if self.error is not None:
+                            raise self.error
+                        return
+                if end is not None:
+                    available = min(available, end + 1)
+                while pos < available:
+                    data = fp.read(min(CHUNK_SIZE, available - pos))
+                    if not data:
+                        raise IOError(f"{self.path} is shorter than expected")
+                    out.write(data)
+                    pos += len(data)
+
+
+class Mirror:
+    """Caches the download page index and Firefox archives for a LAN.
+
+    Archives are kept under their upstream path, each fetched from upstream
+    once no matter how many clients ask for it at the same time.
+    """
+
+    def __init__(
+        self,
+        page_url: str = DOWNLOAD_PAGE_URL,
+        page_max_age: float = DOWNLOAD_PAGE_MAX_AGE,
+        upstream: str = MIRROR_UPSTREAM,
+        cache_max_bytes: int = ARTIFACT_CACHE_MAX_BYTES,
+    ):
+        self.page_url = page_url
+        self.page_max_age = page_max_age
+        self.upstream = upstream.rstrip("/")
+        self.cache_max_bytes = cache_max_bytes
+        self.cache_dir = path_join(get_cache_dir(), "mirror")
+        self._index: Optional[Dict[str, Any]] = None
+        self._index_time = 0.0
+        self._redirects: Dict[str, Tuple[str, float]] = {}
+        # Where each resolved path is fetched from, by path.
+        self._origins: Dict[str, str] = {}
+        self._fetches: Dict[str, MirrorFetch] = {}
+        self._lock = threading.Lock()
+        self._index_lock = threading.Lock()
+
+    def get_index(self) -> Dict[str, Any]:
+        with self._index_lock:
+            if self._index is None or time.time() - self._index_time > (
+                self.page_max_age
+            ):
+                self._index = parsed_download_page(self.page_url, self.page_max_age)
+                self._index_time = time.time()
+            return self._index
+
+    def resolve(self, href: str) -> str:
+        """Return the path on this mirror that a download page link leads to."""
+        index = self.get_index()
+        if not any(
+            href in languages.values()
+            for platforms in index["hrefs"].values()
+            for languages in platforms.values()
+        ):
+            raise LookupError(href)
+        with self._lock:
+            url, resolved_at = self._redirects.get(href, (None, 0.0))
+        if url is None or time.time() - resolved_at > self.page_max_age:
+            url = resolve_download_url(href)
+            with self._lock:
+                self._redirects[href] = (url, time.time())
+                self._origins[urlsplit(url).path] = url
+        return urlsplit(url).path
+
+    def fetch(self, path: str) -> MirrorFetch:
+        cache_path = path_join(self.cache_dir, *path.strip("/").split("/"))
+        with self._lock:
+            if isfile(cache_path):
+                utime(cache_path)
+                return MirrorFetch.complete(cache_path)
+            fetch = self._fetches.get(path)
+            if fetch is None or fetch.finished:
+                # Paths no link resolved to, such as checksum manifests, are
+                # fetched from upstream.
+                url = self._origins.get(path, f"{self.upstream}{path}")
+                fetch = MirrorFetch(url, cache_path)
+                self._fetches[path] = fetch
+                fetch.start(lambda: self._fetch_done(path, fetch))
+            return fetch
+
+    def _fetch_done(self, path: str, fetch: MirrorFetch) -> None:
+        with self._lock:
+            if self._fetches.get(path) is fetch:
+                del self._fetches[path]
+        if fetch.error is None:
+            print(f"Cached {path}.")
+            evict_artifacts(self.cache_max_bytes, self.cache_dir)
+        else:
+            print(f"Could not fetch {path}: {fetch.error}")
+
+
+class MirrorHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self) -> None:
+        self.respond(send_body=True)
+
+    def do_HEAD(self) -> None:
+        self.respond(send_body=False)
+
+    def respond(self, send_body: bool) -> None:
+        mirror = self.server.mirror
+        parts = urlsplit(self.path)
+        try:
+            if parts.path == "/index.json":
+                body = json.dumps(mirror.get_index()).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                if send_body:
+                    self.wfile.write(body)
+            elif parts.path == "/bouncer":
+                location = mirror.resolve(parse_qs(parts.query).get("url", [""])[0])
+                self.send_response(302)
+                self.send_header("Location", location)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+            elif parts.path.startswith("/pub/") and not any(
+                x in ("", ".", "..") for x in parts.path[1:].split("/")
+            ):
+                self.send_artifact(mirror.fetch(parts.path), send_body)
+            else:
+                self.send_error(404)
+        except LookupError:
+            self.send_error(404)
+        except HTTPError as e:
+            self.send_error(e.code)
+        except (URLError, OSError) as e:
+            self.send_error(502, str(e))
+
+    def send_artifact(self, fetch: MirrorFetch, send_body: bool) -> None:
+        fetch.wait_started()
+        size = fetch.size
+        start, end = 0, None if size is None else size - 1
+        match = re.fullmatch(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+        if match and size is not None:
+            start = int(match.group(1))
+            end = min(int(match.group(2) or end), end)
+            if start > end:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        else:
+            self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        if size is None:
+            # Without a length the end of the body is the end of the connection.
+            self.send_header("Connection", "close")
+            self.close_connection = True
+        else:
+            self.send_header("Accept-Ranges", "bytes")
+            self.send_header("Content-Length", str(end - start + 1))
+        self.end_headers()
+        if send_body:
+            try:
+                fetch.copy_to(self.wfile, start, end)
+            except Exception as e:
+                # The headers are out, all that is left is to cut the body short.
+                self.log_error("Transfer of %s stopped: %s", self.path, e)
+                self.close_connection = True
+
+    def log_message(self, format: str, *args: Any) -> None:
+        print(f"{self.address_string()} {format % args}")
+
+
+def serve_mirror(mirror: Mirror, bind: str, port: int) -> None:
+    server = ThreadingHTTPServer((bind, port), MirrorHandler)
+    server.daemon_threads = True
+    server.mirror = mirror
+    print(f"Serving a mirror on http://{bind}:{server.server_address[1]}/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Install Firefox from Mozilla.org, complete with a .desktop file."
+    )
+    subparsers = parser.add_subparsers(dest="command")
+    dedup_parser = subparsers.add_parser(
+        "dedup", help="hardlink identical files across all installed builds"
+    )
+    dedup_parser.add_argument(
+        "--reflink",
+        action="store_true",
+        help="prefer copy-on-write clones where the filesystem supports them",
+    )
+    list_parser = subparsers.add_parser("list", help="list the installed builds")
+    list_parser.add_argument("--json", action="store_true", help="output JSON")
+    status_parser = subparsers.add_parser(
+        "status", help="show the recorded state of installed builds"
+    )
+    status_parser.add_argument(
+        "name", nargs="?", help="install directory, e.g. firefox_release-linux64-en-US"
+    )
+    status_parser.add_argument("--json", action="store_true", help="output JSON")
+    subparsers.add_parser(
+        "desktop",
+        help="rewrite the desktop files of all installed builds that are out of "
+        "date and remove those of builds that are gone",
+    )
+    rollback_parser = subparsers.add_parser(
+        "rollback",
+        help="switch an installed build back to a snapshot of an earlier version",
+    )
+    rollback_parser.add_argument(
+        "name", help="install directory, e.g. firefox_release-linux64-en-US"
+    )
+    rollback_parser.add_argument(
+        "--to",
+        metavar="SNAPSHOT",
+        help="snapshot name or version to roll back to (default: the newest)",
+    )
+    warm_up_parser = subparsers.add_parser(
+        "warm-up",
+        help="prefetch the large files of an installed build into the page cache",
+    )
+    warm_up_parser.add_argument(
+        "name", help="install directory, e.g. firefox_release-linux64-en-US"
+    )
+    warm_up_parser.add_argument(
+        "--launch",
+        action="store_true",
+        help="also start Firefox headless on a throwaway profile and report "
+        "the cold and warm start times",
+    )
+    warm_up_parser.add_argument(
+        "--launch-timeout",
+        type=float,
+        default=WARM_UP_LAUNCH_TIMEOUT,
+        help="seconds to wait for each headless start (default: %(default)s)",
+    )
+    warm_up_parser.add_argument("--json", action="store_true", help="output JSON")
+    serve_parser = subparsers.add_parser(
+        "serve",
+        help="serve the download page index and cached Firefox archives to "
+        "other hosts, for use with --mirror",
+    )
+    serve_parser.add_argument(
+        "--bind", default="0.0.0.0", help="address to listen on (default: %(default)s)"
+    )
+    serve_parser.add_argument(
+        "--port",
+        type=int,
+        default=MIRROR_PORT,
+        help="port to listen on (default: %(default)s)",
+    )
+    serve_parser.add_argument(
+        "--upstream",
+        default=MIRROR_UPSTREAM,
+        help="where files that no download page link led to, such as "
+        "checksum manifests, are fetched from (default: %(default)s)",
+    )
+    check_parser = subparsers.add_parser(
+        "check-updates",
+        help="report, as JSON, which installed builds have a newer version available",
+    )
+    check_parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=8,
+        help="number of concurrent requests (default: %(default)s)",
+    )
+    parser.add_argument(
+        "-s",
+        "--spec",
+        action="append",
+        default=[],
+        type=parse_spec,
+        metavar="PRODUCT:PLATFORM:LANGUAGE",
+        help="install this build without prompting, e.g. desktop_release:linux64:en-US "
+        "(may be given multiple times)",
+    )
+    parser.add_argument(
+        "-f",
+        "--spec-file",
+        action="append",
+        default=[],
+        metavar="FILE",
+        help="read specs to install from FILE, one per line",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=2,
+        help="number of builds to install concurrently (default: %(default)s)",
+    )
+    parser.add_argument(
+        "-c",
+        "--connections",
+        type=int,
+        default=1,
+        help="download using this many parallel ranged connections, "
+        "resuming interrupted downloads (default: 1, stream straight into extraction)",
+    )
+    parser.add_argument(
+        "--extract-workers",
+        type=int,
+        default=EXTRACT_WORKERS,
+        help="number of threads writing extracted files (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="update an existing installation in place, rewriting only the files "
+        "that changed since the last install",
+    )
+    parser.add_argument(
+        "--no-verify",
+        action="store_true",
+        help="do not check downloads against Mozilla's published SHA-512 checksums",
+    )
+    parser.add_argument(
+        "--dedup",
+        action="store_true",
+        help="hardlink identical files across all installed builds afterwards",
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=ARTIFACT_CACHE_MAX_BYTES // (1024 * 1024),
+        metavar="MIB",
+        help="size limit of the download cache in MiB, least recently used "
+        "downloads are evicted first (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="do not reuse or store downloads in the cache",
+    )
+    parser.add_argument(
+        "--page-url",
+        default=DOWNLOAD_PAGE_URL,
+        help="download page to read the builds from (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--page-max-age",
+        type=float,
+        default=DOWNLOAD_PAGE_MAX_AGE,
+        metavar="SECONDS",
+        help="reuse the cached download page index without revalidating it "
+        "for this long (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--keep-snapshots",
+        type=int,
+        default=SNAPSHOT_KEEP,
+        metavar="N",
+        help="keep the last N replaced versions of each install to roll back "
+        "to (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=HTTP_TIMEOUT,
+        metavar="SECONDS",
+        help="network timeout of connections and reads (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--retries",
+        type=int,
+        default=HTTP_RETRIES,
+        help="times a failed request is retried, with exponential backoff "
+        "(default: %(default)s)",
+    )
+    parser.add_argument(
+        "--mirror",
+        metavar="URL",
+        help="get the download page index and archives from a mirror started "
+        "with the serve command",
+    )
+    parser.add_argument(
+        "--warm-up",
+        action="store_true",
+        help="prefetch the large files of each build into the page cache after "
+        "installing it",
+    )
+    parser.add_argument(
+        "--warm-up-launch",
+        action="store_true",
+        help="like --warm-up, and also start each build headless once, "
+        "reporting the cold and warm start times",
+    )
+    parser.add_argument(
+        "--no-progress",
+        action="store_true",
+        help="do not draw download and extraction progress on stderr",
+    )
+    parser.add_argument(
+        "--metrics-json",
+        metavar="PATH",
+        help="write per-phase wall and CPU timings and download throughput "
+        "to PATH as JSON",
+    )
+    parser.add_argument(
+        "--profile",
+        metavar="PATH",
+        help="run under cProfile and write the stats to PATH",
+    )
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    SESSION.timeout = args.timeout
+    SESSION.retries = args.retries
+    if args.no_progress:
+        METRICS.show_progress = False
+    profiler = None
+    if args.profile:
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        run(args)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(args.profile)
+        if args.metrics_json:
+            with open(args.metrics_json, "w", encoding="utf-8") as fp:
+                json.dump(METRICS.as_dict(), fp, indent=2)
+
+
+def load_index(args: argparse.Namespace) -> Dict[str, Any]:
+    if args.mirror:
+        return get_mirror_index(args.mirror)
+    return parsed_download_page(args.page_url, args.page_max_age)
+
+
+def run(args: argparse.Namespace) -> None:
+    if args.command == "dedup":
+        run_dedup(args.reflink)
+        return
+    if args.command == "list":
+        print_installs(args.json)
+        return
+    if args.command == "status":
+        print_installs(args.json, args.name, details=True)
+        return
+    if args.command == "desktop":
+        written, unchanged, removed = sync_desktop_entries()
+        print(
+            f"Desktop files: {written} written, {unchanged} unchanged, "
+            f"{removed} removed."
+        )
+        return
+    if args.command == "rollback":
+        extract_dir = (
+            args.name if isabs(args.name) else path_join(get_install_root(), args.name)
+        )
+        start = time.perf_counter()
+        try:
+            snapshot = rollback_install(extract_dir, args.to)
+        except ValueError as e:
+            print(e)
+            sys.exit(1)
+        print(
+            f"Rolled {basename(extract_dir)} back to "
+            f"{snapshot['version'] or 'an unknown version'} in "
+            f"{(time.perf_counter() - start) * 1000:.0f} ms."
+        )
+        return
+    if args.command == "warm-up":
+        extract_dir = (
+            args.name if isabs(args.name) else path_join(get_install_root(), args.name)
+        )
+        if not isdir(extract_dir):
+            print(f"{args.name} is not installed")
+            sys.exit(1)
+        report = warm_up_install(extract_dir, args.launch, args.launch_timeout)
+        if args.json:
+            print(json.dumps(report, indent=2))
+        else:
+            print_warm_up(report)
+        if report["error"] is not None:
+            sys.exit(1)
+        return
+    if args.command == "serve":
+        mirror = Mirror(
+            args.page_url,
+            args.page_max_age,
+            args.upstream,
+            args.cache_size * 1024 * 1024,
+        )
+        serve_mirror(mirror, args.bind, args.port)
+        return
+    if args.command == "check-updates":
+        # Only the report goes to stdout, so that it can be piped into jq.
+        with redirect_stdout(sys.stderr):
+            report = check_updates(load_index(args), args.jobs)
+        print(json.dumps(report, indent=2))
+        return
+
+    specs = list(args.spec)
+    for path in args.spec_file:
+        specs.extend(read_spec_file(path))
+
+    index = load_index(args)
+    options = {
+        "connections": args.connections,
+        "use_cache": not args.no_cache,
+        "cache_max_bytes": args.cache_size * 1024 * 1024,
+        "extract_workers": args.extract_workers,
+        "incremental": args.incremental,
+        "verify": not args.no_verify,
+        "keep_snapshots": args.keep_snapshots,
+        "warm_up": args.warm_up,
+        "warm_up_launch": args.warm_up_launch,
+    }
+
+    if specs:
+        if args.jobs > 1 and len(specs) > 1:
+            # Concurrent installs would draw over each other's progress.
+            METRICS.show_progress = False
+        results = batch_install(index, specs, args.jobs, **options)
+        print()
+        print("Summary:")
+        for spec, error in results:
+            print(f"  {':'.join(spec)}: {'ok' if error is None else error}")
+        if args.dedup:
+            run_dedup(False)
+        if any(error is not None for _, error in results):
+            sys.exit(1)
+        return
+
+    product_select = get_product_selection(index)
+    platform_select = get_platform_selection(index, product_select)
+    language_select = get_language_selection(index, product_select)
+    install(index, product_select, platform_select, language_select, **options)
+    if args.dedup:
+        run_dedup(False)
 
 
 if __name__ == "__main__":
@@ -323,4 +323,5 @@ Exec=%%%EXTRACT_DIR%%%/firefox --ProfileManager
     "utf-8"
 )
 
-print(base64.b64encode(data))
+if __name__ == "__main__":
+    print(base64.b64encode(data))
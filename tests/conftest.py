@@ -0,0 +1,176 @@
+import io
+import os
+import re
+import tarfile
+import threading
+import time
+from hashlib import sha1, sha512
+from http.server import ThreadingHTTPServer
+from os.path import join as path_join
+from typing import Any, Dict, List, Optional, Tuple
+
+import pytest
+
+import benchmark
+import firefox_installer
+
+SPEC = ("desktop_release", "linux64", "en-US")
+
+
+class StandInHandler(benchmark.MozillaHandler):
+    """MozillaHandler with the faults that tests switch on."""
+
+    # Advertise and honour ranged requests.
+    accept_ranges = True
+    # Advertise ranged requests, but answer them with the whole archive.
+    ignore_ranges = False
+    # Statuses to answer archive GETs with before serving them.
+    fail_with: List[int] = []
+    # Cut the first ranged archive response short after this many bytes.
+    drop_after: Optional[int] = None
+    # Seconds to wait between 64 KiB chunks of an archive.
+    delay = 0.0
+    # Send an ETag for the archive and honour If-Range.
+    etag = True
+    # (method, path, Range header) of every request.
+    requests: List[Tuple[str, str, Optional[str]]] = []
+    lock = threading.Lock()
+
+    def respond(self, send_body: bool) -> None:
+        self.requests.append((self.command, self.path, self.headers.get("Range")))
+        super().respond(send_body)
+
+    def send_archive(self, send_body: bool) -> None:
+        if self.command == "GET" and self.fail_with:
+            self.send_response(self.fail_with.pop(0))
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        with open(self.archive, "rb") as fp:
+            data = fp.read()
+        start, end = 0, len(data) - 1
+        etag = f'"{sha1(data).hexdigest()}"' if self.etag else None
+        match = re.fullmatch(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+        if_range = self.headers.get("If-Range")
+        if (
+            match
+            and self.accept_ranges
+            and not self.ignore_ranges
+            and if_range in (None, etag)
+        ):
+            start = int(match.group(1))
+            end = min(int(match.group(2) or end), end)
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(data)}")
+        else:
+            match = None
+            self.send_response(200)
+        self.send_header("Content-Type", "application/x-tar")
+        self.send_header("Content-Length", str(end - start + 1))
+        if self.accept_ranges:
+            self.send_header("Accept-Ranges", "bytes")
+        if etag is not None:
+            self.send_header("ETag", etag)
+        self.end_headers()
+        if not send_body:
+            return
+        body = data[start : end + 1]
+        if match is not None:
+            with self.lock:
+                drop_after, type(self).drop_after = self.drop_after, None
+            if drop_after is not None:
+                self.wfile.write(body[:drop_after])
+                self.close_connection = True
+                return
+        for i in range(0, len(body), 64 * 1024):
+            time.sleep(self.delay)
+            self.wfile.write(body[i : i + 64 * 1024])
+
+
+@pytest.fixture(autouse=True)
+def isolated(tmp_path: Any, monkeypatch: Any) -> None:
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    monkeypatch.setenv("XDG_DATA_HOME", str(tmp_path / "data"))
+    for name in ("http_proxy", "https_proxy", "all_proxy"):
+        monkeypatch.delenv(name, raising=False)
+        monkeypatch.delenv(name.upper(), raising=False)
+    monkeypatch.setattr(
+        firefox_installer, "SESSION", firefox_installer.HTTPSession(backoff=0.01)
+    )
+    monkeypatch.setattr(firefox_installer.METRICS, "show_progress", False)
+
+
+def make_archive(root: str, name: str, files: int = 16) -> str:
+    benchmark.make_tree(root, files, 128 * 1024)
+    return benchmark.make_archive(root, path_join(root, name), "xz")
+
+
+@pytest.fixture(scope="session")
+def archive(tmp_path_factory: Any) -> str:
+    return make_archive(str(tmp_path_factory.mktemp("archive")), "firefox.tar")
+
+
+@pytest.fixture
+def stand_in(archive: str) -> Any:
+    server = start_stand_in(archive)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def start_stand_in(archive: str) -> ThreadingHTTPServer:
+    """Start a local stand-in for mozilla.org serving archive.
+
+    The server has the handler class, whose attributes switch on faults and
+    record requests, as server.handler and its address as server.url.
+    """
+    handler = type(
+        "Handler",
+        (StandInHandler,),
+        {"requests": [], "fail_with": [], "connections": 0},
+    )
+    handler.archive = archive
+    with open(archive, "rb") as fp:
+        handler.digest = sha512(fp.read()).hexdigest()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    server.handler = handler
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    handler.page = benchmark.make_download_page(server.url, 3)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def get_href(server: Any, spec: Tuple[str, str, str] = SPEC) -> str:
+    return f"{server.url}/bouncer/{'/'.join(spec)}"
+
+
+def file_sha512(path: str) -> str:
+    with open(path, "rb") as fp:
+        return sha512(fp.read()).hexdigest()
+
+
+def make_build(path: Any, files: Dict[str, bytes]) -> str:
+    """Write a build holding files, by their path under firefox/."""
+    with tarfile.open(path, "w:xz") as tar:
+        for name, data in files.items():
+            info = tarfile.TarInfo(f"firefox/{name}")
+            info.size = len(data)
+            info.mode = 0o644
+            tar.addfile(info, io.BytesIO(data))
+    return str(path)
+
+
+def serve(server: Any, path: str) -> None:
+    server.handler.archive = path
+    server.handler.digest = file_sha512(path)
+
+
+def read_tree(root: str) -> Dict[str, bytes]:
+    tree = {}
+    for dirpath, _, names in os.walk(root):
+        for name in names:
+            path = path_join(dirpath, name)
+            with open(path, "rb") as fp:
+                tree[os.path.relpath(path, root)] = fp.read()
+    return tree
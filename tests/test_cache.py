@@ -0,0 +1,68 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import firefox_installer
+from conftest import SPEC, file_sha512, get_href, make_archive
+
+NIGHTLY = (
+    "https://archive.mozilla.org/pub/firefox/nightly/2026/10/"
+    "2026-10-15-09-00-00-mozilla-central/firefox-133.0a1.en-US.linux-x86_64.tar.bz2"
+)
+
+
+def test_nightlies_get_their_own_artifacts():
+    spec = ("desktop_nightly", "linux64", "en-US")
+    today = firefox_installer.get_artifact_path(spec, NIGHTLY)
+    tomorrow = firefox_installer.get_artifact_path(
+        spec, NIGHTLY.replace("2026-10-15", "2026-10-16")
+    )
+    assert today != tomorrow
+    assert today.endswith("firefox-133.0a1.en-US.linux-x86_64.tar.bz2")
+
+
+def test_cached_artifact_is_reused(stand_in, tmp_path, capsys):
+    for _ in range(2):
+        firefox_installer.download_and_extract(
+            get_href(stand_in), str(tmp_path / "firefox"), 1, SPEC
+        )
+    assert "Using cached download..." in capsys.readouterr().out
+    archive_gets = [
+        request
+        for request in stand_in.handler.requests
+        if request[0] == "GET" and request[1].endswith(".tar.xz")
+    ]
+    assert len(archive_gets) == 1
+
+
+def test_concurrent_eviction(tmp_path, capsys):
+    artifacts = tmp_path / "artifacts"
+    for i in range(50):
+        (artifacts / str(i)).mkdir(parents=True)
+        (artifacts / str(i) / "firefox.tar.xz").write_bytes(b"x" * 1000)
+    (artifacts / "0" / "firefox.tar.xz.part").write_bytes(b"x" * 1000)
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(
+            executor.map(
+                lambda _: firefox_installer.evict_artifacts(10 * 1000, str(artifacts)),
+                range(8),
+            )
+        )
+    kept = sorted(path.name for path in artifacts.rglob("*") if path.is_file())
+    assert kept == ["firefox.tar.xz"] * 10 + ["firefox.tar.xz.part"]
+
+
+def test_rebuild_at_same_url_is_not_a_cache_hit(stand_in, tmp_path, capsys):
+    extract_dir = str(tmp_path / "firefox")
+    firefox_installer.download_and_extract(get_href(stand_in), extract_dir, 1, SPEC)
+    # Replaced in place, like the latest nightly.
+    stand_in.handler.archive = make_archive(str(tmp_path / "next"), "firefox.tar", 4)
+    stand_in.handler.digest = file_sha512(stand_in.handler.archive)
+    capsys.readouterr()
+
+    firefox_installer.download_and_extract(get_href(stand_in), extract_dir, 1, SPEC)
+    out = capsys.readouterr().out
+    assert "Using cached download..." not in out
+    assert "SHA-512 checksum verified." in out
+    (record,) = firefox_installer.get_installs(extract_dir)
+    assert record["sha512"] == stand_in.handler.digest
+    assert not os.path.exists(os.path.join(extract_dir, "dir15"))
@@ -0,0 +1,86 @@
+import json
+import os
+import subprocess
+import sys
+from os.path import dirname
+from os.path import join as path_join
+
+import pytest
+
+import firefox_installer
+
+INSTALLER = path_join(
+    dirname(dirname(os.path.abspath(__file__))), "firefox_installer.py"
+)
+LATEST = (
+    "https://archive.mozilla.org/pub/firefox/nightly/latest-mozilla-central/"
+    "firefox-133.0a1.en-US.linux-x86_64.tar.bz2"
+)
+SPEC = ("desktop_nightly", "linux64", "en-US")
+INDEX = {
+    "platforms": {"desktop_nightly": ["linux64"]},
+    "hrefs": {"desktop_nightly": {"linux64": {"en-US": "https://bouncer/nightly"}}},
+}
+
+
+@pytest.fixture
+def nightly(monkeypatch):
+    extract_dir = firefox_installer.get_extract_dir(*SPEC)
+    os.makedirs(extract_dir)
+    with open(path_join(extract_dir, "application.ini"), "w") as fp:
+        fp.write("[App]\nVersion=133.0a1\nBuildID=20261015093512\n")
+    firefox_installer.record_install(extract_dir, SPEC, LATEST, None, {})
+    build = {"url": LATEST, "build_id": "20261015093512"}
+    monkeypatch.setattr(
+        firefox_installer, "resolve_download_url", lambda url: build["url"]
+    )
+    monkeypatch.setattr(
+        firefox_installer, "get_build_id", lambda url: build["build_id"]
+    )
+    return build
+
+
+def test_same_nightly_is_current(nightly):
+    (report,) = firefox_installer.check_updates(INDEX)
+    assert report["error"] is None
+    assert report["update_available"] is False
+
+
+def test_newer_build_id_is_an_update(nightly):
+    nightly["build_id"] = "20261016093512"
+    (report,) = firefox_installer.check_updates(INDEX)
+    assert report["available_version"] == report["installed_version"] == "133.0a1"
+    assert report["available_build_id"] == "20261016093512"
+    assert report["update_available"] is True
+
+
+def test_other_build_directory_is_an_update(nightly):
+    nightly["url"] = LATEST.replace(
+        "latest-mozilla-central", "2026/10/2026-10-16-09-35-12-mozilla-central"
+    )
+    (report,) = firefox_installer.check_updates(INDEX)
+    assert report["update_available"] is True
+
+
+def test_command_prints_only_json(stand_in):
+    extract_dir = firefox_installer.get_extract_dir("desktop_release", "linux64", "de")
+    os.makedirs(extract_dir)
+    with open(path_join(extract_dir, "application.ini"), "w") as fp:
+        fp.write("[App]\nVersion=117.0\n")
+    proc = subprocess.run(
+        [
+            sys.executable,
+            INSTALLER,
+            "--page-url",
+            f"{stand_in.url}/firefox/all/",
+            "check-updates",
+        ],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        check=True,
+    )
+    (report,) = json.loads(proc.stdout)
+    assert report["install"] == "firefox_release-linux64-de"
+    assert report["available_version"] == "118.0"
+    assert report["update_available"] is True
+    assert b"download page" in proc.stderr
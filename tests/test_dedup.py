@@ -0,0 +1,49 @@
+import os
+from os.path import join as path_join
+
+import firefox_installer
+from conftest import get_href, make_build, read_tree, serve
+
+V1 = {"same.txt": b"same", "changed.so": b"old build", "removed.ja": b"gone"}
+V2 = {"same.txt": b"same", "changed.so": b"new build!", "added.ja": b"new"}
+SPECS = [
+    ("desktop_release", "linux64", "en-US"),
+    ("desktop_release", "linux64", "de"),
+]
+
+
+def install_all(server, **options):
+    extract_dirs = []
+    for spec in SPECS:
+        extract_dir = firefox_installer.get_extract_dir(*spec)
+        firefox_installer.download_and_extract(
+            get_href(server, spec), extract_dir, 1, spec, **options
+        )
+        extract_dirs.append(extract_dir)
+    return extract_dirs
+
+
+def get_inode(extract_dir, name):
+    return os.stat(path_join(extract_dir, name)).st_ino
+
+
+def test_dedup_installs(stand_in, tmp_path):
+    serve(stand_in, make_build(tmp_path / "v1.tar.xz", V1))
+    first, second = install_all(stand_in)
+    os.chmod(path_join(second, "removed.ja"), 0o600)
+
+    assert firefox_installer.dedup_installs() == (2, len(b"same" + b"old build"))
+    for name in ("same.txt", "changed.so"):
+        assert get_inode(first, name) == get_inode(second, name)
+    # Hardlinks share a mode, so files whose modes differ are left alone.
+    assert get_inode(first, "removed.ja") != get_inode(second, "removed.ja")
+    assert firefox_installer.dedup_installs() == (0, 0)
+
+    # An update writes new files rather than through the shared inodes.
+    serve(stand_in, make_build(tmp_path / "v2.tar.xz", V2))
+    firefox_installer.download_and_extract(
+        get_href(stand_in, SPECS[0]), first, 1, SPECS[0], incremental=True
+    )
+    assert read_tree(first) == V2
+    assert read_tree(second) == V1
+    assert firefox_installer.dedup_installs() == (0, 0)
@@ -0,0 +1,47 @@
+import os
+from os.path import isfile
+
+import firefox_installer
+
+
+def make_install(name):
+    extract_dir = os.path.join(firefox_installer.get_install_root(), name)
+    os.makedirs(extract_dir)
+    return extract_dir
+
+
+def write_entry(spec, extract_dir):
+    os.makedirs(firefox_installer.get_applications_dir(), exist_ok=True)
+    desktop_file = firefox_installer.get_desktop_file(*spec)
+    with open(desktop_file, "wb") as fp:
+        fp.write(firefox_installer.render_desktop_entry(spec[0], extract_dir))
+    return desktop_file
+
+
+def test_sync_keeps_entries_of_unrecorded_installs():
+    # Installed before the state database existed.
+    esr = write_entry(
+        ("desktop_esr", "linux64", "de"), make_install("firefox_esr-linux64-de")
+    )
+    release_dir = make_install("firefox_release-linux64-fr")
+    firefox_installer.create_desktop("desktop_release", "linux64", "fr", release_dir)
+    gone = write_entry(
+        ("desktop_beta", "linux64", "de"),
+        os.path.join(firefox_installer.get_install_root(), "firefox_beta-linux64-de"),
+    )
+
+    assert firefox_installer.sync_desktop_entries() == (0, 1, 1)
+    assert isfile(esr)
+    assert not isfile(gone)
+
+
+def test_sync_rewrites_stale_entries():
+    extract_dir = make_install("firefox_release-linux64-fr")
+    firefox_installer.create_desktop("desktop_release", "linux64", "fr", extract_dir)
+    desktop_file = firefox_installer.get_desktop_file(
+        "desktop_release", "linux64", "fr"
+    )
+    with open(desktop_file, "ab") as fp:
+        fp.write(b"# edited\n")
+    assert firefox_installer.sync_desktop_entries() == (1, 0, 0)
+    assert firefox_installer.sync_desktop_entries() == (0, 1, 0)
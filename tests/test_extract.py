@@ -0,0 +1,64 @@
+import io
+import os
+import tarfile
+
+import pytest
+
+import firefox_installer
+
+
+def make_tar(members):
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode="w") as tar:
+        for name, linkname, data in members:
+            info = tarfile.TarInfo(name)
+            if linkname is not None:
+                info.type = tarfile.SYMTYPE
+                info.linkname = linkname
+                tar.addfile(info)
+            else:
+                info.size = len(data)
+                info.mode = 0o644
+                tar.addfile(info, io.BytesIO(data))
+    buf.seek(0)
+    return tarfile.open(fileobj=buf, mode="r|")
+
+
+def extract(members, dest):
+    return firefox_installer.extract_tar(make_tar(members), None, str(dest))
+
+
+@pytest.mark.parametrize(
+    "members",
+    [
+        [("a", "..", None)],
+        [("a", "/etc", None)],
+        [("d/a", "../..", None)],
+        # Lexically inside, but a/b is really dest/b and .. leaves dest.
+        [("a", ".", None), ("a/b", "..", None)],
+    ],
+)
+def test_symlinks_out_of_dest_are_refused(tmp_path, members):
+    dest = tmp_path / "dest"
+    dest.mkdir()
+    with pytest.raises(firefox_installer.UnsafeArchiveError):
+        extract(members, dest)
+    assert not os.path.lexists(dest / "b")
+
+
+def test_symlinks_inside_dest_are_extracted(tmp_path):
+    dest = tmp_path / "dest"
+    dest.mkdir()
+    manifest, written = extract(
+        [
+            ("lib/libxul.so", None, b"xul"),
+            ("libxul.so", "lib/libxul.so", None),
+            ("lib/self", ".", None),
+            ("lib/up", "..", None),
+        ],
+        dest,
+    )
+    assert (dest / "libxul.so").read_bytes() == b"xul"
+    assert os.readlink(dest / "lib" / "up") == ".."
+    assert list(manifest) == ["lib/libxul.so"]
+    assert written == 1
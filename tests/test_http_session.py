@@ -0,0 +1,113 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.error import HTTPError
+
+import pytest
+
+import firefox_installer
+from conftest import get_href
+
+
+def get_requests(server, suffix):
+    return [
+        request
+        for request in server.handler.requests
+        if request[0] == "GET" and request[1].endswith(suffix)
+    ]
+
+
+def test_requests_share_one_connection(stand_in):
+    url = f"{stand_in.url}/pub/firefox/releases/118.0/SHA512SUMS"
+    for _ in range(10):
+        with firefox_installer.SESSION.open(url) as resp:
+            assert resp.read()
+    stats = firefox_installer.SESSION.get_stats()
+    assert stats["requests"] == 10
+    assert stats["connections_opened"] == stand_in.handler.connections == 1
+
+
+def test_ranged_download_reuses_connections(stand_in, tmp_path, monkeypatch):
+    monkeypatch.setattr(firefox_installer, "MIN_SEGMENT_SIZE", 64 * 1024)
+    for i in range(3):
+        firefox_installer.ranged_download(get_href(stand_in), str(tmp_path / str(i)), 4)
+    opened = firefox_installer.SESSION.get_stats()["connections_opened"]
+    assert opened == stand_in.handler.connections
+    assert opened <= 4
+
+
+def test_redirects_are_cached(stand_in):
+    for _ in range(3):
+        with firefox_installer.SESSION.open(get_href(stand_in), "HEAD") as resp:
+            assert resp.geturl().endswith("/firefox-118.0.tar.xz")
+    bouncer = [
+        request for request in stand_in.handler.requests if "/bouncer/" in request[1]
+    ]
+    assert len(bouncer) == 1
+    assert firefox_installer.SESSION.get_stats()["redirect_cache_hits"] == 2
+
+
+def test_server_errors_are_retried(stand_in, archive):
+    stand_in.handler.fail_with = [503, 502]
+    with firefox_installer.SESSION.open(get_href(stand_in)) as resp:
+        assert resp.status == 200
+        with open(archive, "rb") as fp:
+            assert resp.read() == fp.read()
+    assert len(get_requests(stand_in, ".tar.xz")) == 3
+    assert firefox_installer.SESSION.get_stats()["connections_opened"] == 1
+
+
+def test_retries_give_up(stand_in):
+    firefox_installer.SESSION.retries = 2
+    stand_in.handler.fail_with = [503] * 5
+    with pytest.raises(HTTPError) as excinfo:
+        firefox_installer.SESSION.open(get_href(stand_in))
+    assert excinfo.value.code == 503
+    assert len(get_requests(stand_in, ".tar.xz")) == 3
+
+
+class ChunkedHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    chunks = 1024
+    sent = 0
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        chunk = b"x" * (64 * 1024)
+        try:
+            for _ in range(self.chunks):
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+                type(self).sent += len(chunk)
+            self.wfile.write(b"0\r\n\r\n")
+        except OSError:
+            self.close_connection = True
+
+
+def test_early_close_does_not_drain_chunked_body():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ChunkedHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}/"
+        with firefox_installer.SESSION.open(url) as resp:
+            assert resp.read(10) == b"x" * 10
+        # Only what fits in the socket buffers was sent, not 64 MiB.
+        assert ChunkedHandler.sent < ChunkedHandler.chunks * 64 * 1024 // 4
+        with firefox_installer.SESSION.open(url) as resp:
+            resp.read(10)
+        assert firefox_installer.SESSION.get_stats()["connections_opened"] == 2
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_early_close_drains_short_body(stand_in):
+    url = f"{stand_in.url}/pub/firefox/releases/118.0/SHA512SUMS"
+    for _ in range(3):
+        with firefox_installer.SESSION.open(url) as resp:
+            assert resp.read(10)
+    assert firefox_installer.SESSION.get_stats()["connections_opened"] == 1
@@ -0,0 +1,36 @@
+import os
+from hashlib import sha256
+
+import pytest
+
+import firefox_installer
+from conftest import SPEC, get_href, make_build, read_tree, serve
+
+V1 = {"same.txt": b"same", "changed.so": b"old build", "removed.ja": b"gone"}
+V2 = {"same.txt": b"same", "changed.so": b"new build!", "added.ja": b"new"}
+
+
+@pytest.mark.parametrize("verify", [True, False])
+def test_incremental_update(stand_in, tmp_path, capsys, verify):
+    extract_dir = str(tmp_path / "firefox")
+    serve(stand_in, make_build(tmp_path / "v1.tar.xz", V1))
+    firefox_installer.download_and_extract(
+        get_href(stand_in), extract_dir, 1, SPEC, verify=verify
+    )
+    assert read_tree(extract_dir) == V1
+    unchanged_inode = os.stat(os.path.join(extract_dir, "same.txt")).st_ino
+
+    serve(stand_in, make_build(tmp_path / "v2.tar.xz", V2))
+    capsys.readouterr()
+    firefox_installer.download_and_extract(
+        get_href(stand_in), extract_dir, 1, SPEC, verify=verify, incremental=True
+    )
+    out = capsys.readouterr().out
+    assert "Updated in place: 2 files written, 1 removed, 1 unchanged." in out
+    assert read_tree(extract_dir) == V2
+    assert os.stat(os.path.join(extract_dir, "same.txt")).st_ino == unchanged_inode
+    assert firefox_installer.load_manifest(extract_dir) == {
+        name: [len(data), sha256(data).hexdigest()] for name, data in V2.items()
+    }
+    (record,) = firefox_installer.get_installs(extract_dir)
+    assert record["sha512"] == stand_in.handler.digest
@@ -0,0 +1,117 @@
+import os
+import subprocess
+import sys
+import time
+from os.path import dirname, isdir
+from os.path import join as path_join
+from urllib.error import HTTPError
+
+import pytest
+
+import firefox_installer
+from conftest import SPEC, start_stand_in
+
+INSTALLER = path_join(
+    dirname(dirname(os.path.abspath(__file__))), "firefox_installer.py"
+)
+
+
+def get_env(home):
+    return dict(
+        os.environ,
+        XDG_CACHE_HOME=path_join(home, "cache"),
+        XDG_DATA_HOME=path_join(home, "data"),
+        PYTHONUNBUFFERED="1",
+    )
+
+
+@pytest.fixture
+def upstream(archive):
+    # Where the mirror gets files from that no download page link led to.
+    server = start_stand_in(archive)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def mirror(stand_in, upstream, tmp_path):
+    log_path = tmp_path / "mirror.log"
+    with open(log_path, "wb") as log:
+        proc = subprocess.Popen(
+            [
+                sys.executable,
+                INSTALLER,
+                "--page-url",
+                f"{stand_in.url}/firefox/all/",
+                "serve",
+                "--bind",
+                "127.0.0.1",
+                "--port",
+                "0",
+                "--upstream",
+                upstream.url,
+            ],
+            stdout=log,
+            stderr=subprocess.STDOUT,
+            env=get_env(str(tmp_path / "mirror")),
+        )
+    try:
+        deadline = time.monotonic() + 30
+        while "Serving a mirror on" not in log_path.read_text():
+            assert proc.poll() is None, log_path.read_text()
+            assert time.monotonic() < deadline
+            time.sleep(0.05)
+        line = log_path.read_text().split("Serving a mirror on ", 1)[1]
+        yield line.split()[0].rstrip("/")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def test_clients_share_one_upstream_fetch(stand_in, upstream, mirror, tmp_path):
+    # Slow enough that the clients overlap with the upstream download.
+    stand_in.handler.delay = 0.1
+    clients = [
+        subprocess.Popen(
+            [
+                sys.executable,
+                INSTALLER,
+                "--mirror",
+                mirror,
+                "--no-progress",
+                "-s",
+                ":".join(SPEC),
+            ],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            env=get_env(str(tmp_path / f"client{i}")),
+        )
+        for i in range(3)
+    ]
+    for i, client in enumerate(clients):
+        output = client.communicate(timeout=120)[0].decode("utf-8", "replace")
+        assert client.returncode == 0, output
+        assert "SHA-512 checksum verified." in output
+        install_root = path_join(
+            str(tmp_path / f"client{i}"), "data", "rany2_firefox_installer"
+        )
+        assert isdir(path_join(install_root, "firefox_release-linux64-en-US", "dir0"))
+
+    gets = [request[1] for request in stand_in.handler.requests if request[0] == "GET"]
+    assert len([path for path in gets if path.endswith(".tar.xz")]) == 1
+    assert gets.count("/firefox/all/") == 1
+    # Links resolved to the stand-in, the checksums come from --upstream.
+    assert [path for path in gets if path.endswith("/SHA512SUMS")] == []
+    upstream_gets = [
+        request[1] for request in upstream.handler.requests if request[0] == "GET"
+    ]
+    assert upstream_gets == ["/pub/firefox/releases/118.0/SHA512SUMS"]
+
+
+def test_mirror_only_resolves_page_links(mirror):
+    with pytest.raises(HTTPError) as excinfo:
+        firefox_installer.SESSION.open(
+            firefox_installer.get_mirror_href(mirror, "http://example.com/evil")
+        )
+    assert excinfo.value.code == 404
@@ -0,0 +1,109 @@
+from os.path import getsize, isfile
+
+import pytest
+
+import firefox_installer
+from conftest import file_sha512, get_href
+
+
+@pytest.fixture(autouse=True)
+def small_segments(monkeypatch):
+    monkeypatch.setattr(firefox_installer, "MIN_SEGMENT_SIZE", 64 * 1024)
+
+
+def get_ranges(server):
+    return [
+        request[2]
+        for request in server.handler.requests
+        if request[0] == "GET" and request[2] is not None
+    ]
+
+
+def test_segments_are_reassembled(stand_in, archive, tmp_path):
+    path, url = firefox_installer.ranged_download(get_href(stand_in), str(tmp_path), 4)
+    assert url.endswith("/linux64/en-US/firefox-118.0.tar.xz")
+    assert file_sha512(path) == file_sha512(archive)
+    ranges = get_ranges(stand_in)
+    assert len(ranges) == 4
+    assert len(set(ranges)) == 4
+    assert not isfile(f"{path}.checkpoint")
+
+
+def test_interrupted_download_resumes(stand_in, archive, tmp_path, capsys):
+    stand_in.handler.drop_after = 10 * 1024
+    with pytest.raises(Exception):
+        firefox_installer.ranged_download(get_href(stand_in), str(tmp_path), 4)
+    downloads = list(tmp_path.iterdir())
+    assert any(path.name.endswith(".checkpoint") for path in downloads)
+
+    first = len(get_ranges(stand_in))
+    path, _ = firefox_installer.ranged_download(get_href(stand_in), str(tmp_path), 4)
+    assert "Resuming download" in capsys.readouterr().out
+    assert file_sha512(path) == file_sha512(archive)
+    # Only the segment that was cut short is requested again, from where it
+    # stopped.
+    resumed = get_ranges(stand_in)[first:]
+    segments = firefox_installer.split_ranges(getsize(archive), 4)
+    assert len(resumed) == 1
+    assert resumed[0] in [
+        f"bytes={start + 10 * 1024}-{end}" for start, end, _ in segments
+    ]
+
+
+def test_ignored_ranges_fall_back_to_one_connection(
+    stand_in, archive, tmp_path, capsys
+):
+    stand_in.handler.ignore_ranges = True
+    path, _ = firefox_installer.ranged_download(get_href(stand_in), str(tmp_path), 4)
+    assert "Server ignored ranged requests" in capsys.readouterr().out
+    assert file_sha512(path) == file_sha512(archive)
+    assert not isfile(f"{path}.checkpoint")
+
+
+def test_unsupported_ranges_use_one_connection(stand_in, archive, tmp_path, capsys):
+    stand_in.handler.accept_ranges = False
+    path, _ = firefox_installer.ranged_download(get_href(stand_in), str(tmp_path), 4)
+    assert "Server does not support ranged requests" in capsys.readouterr().out
+    assert file_sha512(path) == file_sha512(archive)
+    assert get_ranges(stand_in) == []
+
+
+def rebuild(archive, path):
+    # Same size, different contents, as when a nightly is replaced in place.
+    with open(archive, "rb") as fp:
+        data = bytearray(fp.read())
+    data[len(data) // 2] ^= 0xFF
+    path.write_bytes(bytes(data))
+    return str(path)
+
+
+def test_changed_file_is_not_resumed(stand_in, archive, tmp_path, capsys):
+    stand_in.handler.drop_after = 10 * 1024
+    with pytest.raises(Exception):
+        firefox_installer.ranged_download(
+            get_href(stand_in), str(tmp_path / "downloads"), 4
+        )
+    stand_in.handler.archive = rebuild(archive, tmp_path / "rebuilt.tar.xz")
+    capsys.readouterr()
+
+    path, _ = firefox_installer.ranged_download(
+        get_href(stand_in), str(tmp_path / "downloads"), 4
+    )
+    assert "Resuming download" not in capsys.readouterr().out
+    assert file_sha512(path) == file_sha512(stand_in.handler.archive)
+
+
+def test_segments_are_conditional(stand_in, archive, tmp_path):
+    final_url, size, _, validator = firefox_installer.probe_download(get_href(stand_in))
+    assert validator is not None
+    stand_in.handler.archive = rebuild(archive, tmp_path / "rebuilt.tar.xz")
+    path = tmp_path / "archive"
+    path.write_bytes(b"\0" * size)
+    checkpoint = firefox_installer.Checkpoint(
+        str(tmp_path / "archive.checkpoint"), final_url, size, [[0, 1023, 0]], validator
+    )
+    with pytest.raises(firefox_installer.RangesUnsupported):
+        firefox_installer.fetch_segment(
+            final_url, str(path), checkpoint.segments[0], checkpoint
+        )
+    assert stand_in.handler.requests[-1][2] == "bytes=0-1023"
@@ -0,0 +1,43 @@
+import os
+from hashlib import sha256
+from os.path import isfile
+from os.path import join as path_join
+from stat import S_IMODE
+
+import firefox_installer
+from conftest import SPEC, file_sha512, get_href, make_archive
+
+
+def test_mode_change_does_not_touch_shared_inode(tmp_path):
+    target = str(tmp_path / "libxul.so")
+    snapshot = str(tmp_path / "snapshot")
+    with open(target, "wb") as fp:
+        fp.write(b"data")
+    os.chmod(target, 0o644)
+    os.link(target, snapshot)
+
+    previous = [4, sha256(b"data").hexdigest()]
+    assert firefox_installer.write_member(target, b"data", 0o755, 0, previous)[2]
+    assert S_IMODE(os.stat(target).st_mode) == 0o755
+    assert S_IMODE(os.stat(snapshot).st_mode) == 0o644
+    assert not firefox_installer.write_member(target, b"data", 0o755, 0, previous)[2]
+
+
+def test_reinstall_then_rollback(stand_in, tmp_path):
+    extract_dir = str(tmp_path / "firefox")
+    href = get_href(stand_in)
+    firefox_installer.download_and_extract(href, extract_dir, 1, SPEC)
+    # The same build again leaves nothing to roll back to.
+    firefox_installer.download_and_extract(href, extract_dir, 1, SPEC)
+    assert firefox_installer.get_snapshots(extract_dir) == []
+    before = firefox_installer.load_manifest(extract_dir)
+
+    stand_in.handler.archive = make_archive(str(tmp_path / "next"), "next.tar", 4)
+    stand_in.handler.digest = file_sha512(stand_in.handler.archive)
+    firefox_installer.download_and_extract(href, extract_dir, 1, SPEC, use_cache=False)
+    assert len(firefox_installer.get_snapshots(extract_dir)) == 1
+    assert firefox_installer.load_manifest(extract_dir) != before
+
+    firefox_installer.rollback_install(extract_dir)
+    assert firefox_installer.load_manifest(extract_dir) == before
+    assert isfile(path_join(extract_dir, "dir15", "file15"))
@@ -0,0 +1,117 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from os.path import isdir, islink
+from os.path import join as path_join
+
+import pytest
+
+import firefox_installer
+from conftest import SPEC, file_sha512, get_href, make_archive
+
+
+@pytest.fixture(scope="session")
+def other_archive(tmp_path_factory):
+    # A different build under the same name, the digest published for the
+    # stand-in's archive does not match it.
+    return make_archive(str(tmp_path_factory.mktemp("other")), "firefox.tar", 4)
+
+
+def read_tree(root):
+    tree = {}
+    for dirpath, _, names in os.walk(root):
+        for name in names:
+            path = path_join(dirpath, name)
+            rel = os.path.relpath(path, root)
+            tree[rel] = os.readlink(path) if islink(path) else file_sha512(path)
+    return tree
+
+
+def install(server, extract_dir, connections, **options):
+    firefox_installer.download_and_extract(
+        get_href(server), extract_dir, connections, SPEC, **options
+    )
+
+
+@pytest.mark.parametrize("connections", [1, 2])
+def test_verified_install(stand_in, tmp_path, capsys, connections):
+    extract_dir = str(tmp_path / "firefox")
+    install(stand_in, extract_dir, connections)
+    assert "SHA-512 checksum verified." in capsys.readouterr().out
+    assert isdir(path_join(extract_dir, "dir0"))
+    (record,) = firefox_installer.get_installs(extract_dir)
+    assert record["sha512"] == stand_in.handler.digest
+    assert record["version"] == "118.0"
+
+
+@pytest.mark.parametrize("connections", [1, 2])
+def test_mismatch_leaves_old_install(stand_in, other_archive, tmp_path, connections):
+    extract_dir = str(tmp_path / "firefox")
+    install(stand_in, extract_dir, connections, use_cache=False)
+    before = read_tree(extract_dir)
+
+    stand_in.handler.archive = other_archive
+    with pytest.raises(firefox_installer.ChecksumMismatch):
+        install(stand_in, extract_dir, connections)
+    assert read_tree(extract_dir) == before
+    (record,) = firefox_installer.get_installs(extract_dir)
+    assert record["sha512"] == stand_in.handler.digest
+    # The corrupt download is not cached.
+    artifacts = path_join(firefox_installer.get_cache_dir(), "artifacts")
+    assert [names for _, _, names in os.walk(artifacts) if names] == []
+
+
+def test_incremental_mismatch_leaves_old_install(stand_in, other_archive, tmp_path):
+    extract_dir = str(tmp_path / "firefox")
+    install(stand_in, extract_dir, 1, use_cache=False)
+    before = read_tree(extract_dir)
+
+    stand_in.handler.archive = other_archive
+    for _ in range(2):
+        with pytest.raises(firefox_installer.ChecksumMismatch):
+            install(stand_in, extract_dir, 1, incremental=True)
+    assert read_tree(extract_dir) == before
+    # Nothing was written, so there was nothing to snapshot.
+    assert firefox_installer.get_snapshots(extract_dir) == []
+
+
+def test_concurrent_checksum_fetches(stand_in):
+    # Every build of a release shares one SHA512SUMS.
+    urls = [
+        f"{stand_in.url}/pub/firefox/releases/118.0/linux64/{language}/"
+        "firefox-118.0.tar.xz"
+        for language in ("en-US", "de", "fr")
+    ] * 8
+    with ThreadPoolExecutor(max_workers=len(urls)) as executor:
+        digests = list(
+            executor.map(
+                lambda url: firefox_installer.get_expected_sha512(url, refresh=True),
+                urls,
+            )
+        )
+    assert digests == [stand_in.handler.digest] * len(urls)
+    checksums = path_join(firefox_installer.get_cache_dir(), "checksums")
+    assert [name.endswith("-SHA512SUMS") for name in os.listdir(checksums)] == [True]
+
+
+def test_incremental_update_hashes_archive_once(stand_in, tmp_path, monkeypatch):
+    extract_dir = str(tmp_path / "firefox")
+    install(stand_in, extract_dir, 1, use_cache=False)
+    hashed = []
+    file_digest = firefox_installer.file_digest
+
+    def counting_file_digest(path, name="sha256"):
+        if name == "sha512":
+            hashed.append(path)
+        return file_digest(path, name)
+
+    class CountingHashingReader(firefox_installer.HashingReader):
+        def __init__(self, fileobj):
+            hashed.append(fileobj)
+            super().__init__(fileobj)
+
+    monkeypatch.setattr(firefox_installer, "file_digest", counting_file_digest)
+    monkeypatch.setattr(firefox_installer, "HashingReader", CountingHashingReader)
+    install(stand_in, extract_dir, 1, use_cache=False, incremental=True)
+    assert len(hashed) == 1
+    (record,) = firefox_installer.get_installs(extract_dir)
+    assert record["sha512"] == stand_in.handler.digest
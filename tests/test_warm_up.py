@@ -0,0 +1,112 @@
+import json
+import os
+import subprocess
+import sys
+from os.path import dirname, exists, getsize
+from os.path import join as path_join
+
+import pytest
+
+import firefox_installer
+
+MIB = 1024 * 1024
+INSTALLER = path_join(
+    dirname(dirname(os.path.abspath(__file__))), "firefox_installer.py"
+)
+# Takes longer to start on a fresh profile, like Firefox building its caches.
+STUB_FIREFOX = """#!/bin/sh
+echo "$@" >> "$(dirname "$0")/launches.log"
+while [ $# -gt 0 ]; do
+    case "$1" in
+        --profile) profile=$2; shift ;;
+        --screenshot) screenshot=$2; shift ;;
+    esac
+    shift
+done
+if [ -e "$profile/startupCache" ]; then
+    sleep 0.05
+else
+    sleep 0.5
+    mkdir "$profile/startupCache"
+fi
+: > "$screenshot"
+"""
+
+
+@pytest.fixture
+def extract_dir(tmp_path):
+    extract_dir = str(tmp_path / "data" / "rany2_firefox_installer" / "firefox_x")
+    os.makedirs(path_join(extract_dir, "browser"))
+    for name, size in (("libxul.so", 3 * MIB), ("browser/omni.ja", 2 * MIB)):
+        with open(path_join(extract_dir, name), "wb") as fp:
+            fp.truncate(size)
+    with open(path_join(extract_dir, "application.ini"), "w") as fp:
+        fp.write("[App]\nVersion=118.0\n")
+    with open(path_join(extract_dir, "firefox"), "w") as fp:
+        fp.write(STUB_FIREFOX)
+    os.chmod(path_join(extract_dir, "firefox"), 0o755)
+    return extract_dir
+
+
+def read_launches(extract_dir):
+    with open(path_join(extract_dir, "launches.log")) as fp:
+        return [line.split() for line in fp]
+
+
+def test_prefetch_uses_manifest(extract_dir):
+    firefox_installer.record_install(
+        extract_dir,
+        None,
+        "http://example.com/firefox-118.0.tar.xz",
+        None,
+        {
+            "libxul.so": [3 * MIB, "0" * 64],
+            "browser/omni.ja": [2 * MIB, "0" * 64],
+            "application.ini": [21, "0" * 64],
+        },
+    )
+    # Not part of the recorded install, so not prefetched.
+    with open(path_join(extract_dir, "stray.bin"), "wb") as fp:
+        fp.truncate(4 * MIB)
+    assert firefox_installer.prefetch_install(extract_dir) == (2, 5 * MIB)
+
+
+def test_prefetch_without_manifest(extract_dir):
+    assert firefox_installer.prefetch_install(extract_dir) == (2, 5 * MIB)
+    small = sum(
+        getsize(path_join(extract_dir, x)) for x in ("firefox", "application.ini")
+    )
+    assert firefox_installer.prefetch_install(extract_dir, 0) == (4, 5 * MIB + small)
+
+
+def test_launch_reports_cold_and_warm_start(extract_dir):
+    report = firefox_installer.warm_up_install(extract_dir, launch=True)
+    assert report["error"] is None
+    assert report["prefetched_files"] == 2
+    assert report["cold_start_seconds"] > report["warm_start_seconds"]
+    launches = read_launches(extract_dir)
+    assert len(launches) == 2
+    assert "--headless" in launches[0]
+    profile = launches[0][launches[0].index("--profile") + 1]
+    assert launches[1][launches[1].index("--profile") + 1] == profile
+    assert not exists(profile)
+
+
+def test_failed_launch_is_reported(extract_dir):
+    with open(path_join(extract_dir, "firefox"), "w") as fp:
+        fp.write("#!/bin/sh\nexit 1\n")
+    report = firefox_installer.warm_up_install(extract_dir, launch=True)
+    assert report["error"].startswith("CalledProcessError")
+    assert report["prefetched_files"] == 2
+
+
+def test_warm_up_command(extract_dir):
+    proc = subprocess.run(
+        [sys.executable, INSTALLER, "warm-up", "firefox_x", "--launch", "--json"],
+        stdout=subprocess.PIPE,
+        check=True,
+    )
+    report = json.loads(proc.stdout)
+    assert report["install"] == "firefox_x"
+    assert report["cold_start_seconds"] is not None
+    assert report["warm_start_seconds"] is not None